@@ -1,13 +1,40 @@
+from functools import lru_cache
+from pathlib import Path
 from typing import Annotated
-from fastapi import Depends, FastAPI
+import os
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
-import pandas as pd
 import api.models as models
 from api.db import engine, Base, get_db
+from api.metrics import MetricsMiddleware, TimedRoute, instrument_engine, registry
+from tether.model.graph import RelationGraph
+from tether.model.index import ColumnIndex, DomainIndex, lookup_domains
+from tether.utils.payload import (
+    domain_graph_path,
+    domain_relation_edges,
+    domain_sort_key,
+    iter_chunks,
+)
+from tether.utils.search import ColumnSearchIndex
+
+
+OUTPUT_DIR = Path(os.environ.get("TETHER_OUTPUT_DIR", "../data/output"))
+MODEL_PATH = Path(
+    os.environ.get("TETHER_MODEL_PATH", "../tether/checkpoints/item_autoencoder.pth")
+)
+# Endpoints that run the item encoder need torch, which is only imported when
+# they are enabled.
+ENABLE_MODEL_ENDPOINTS = os.environ.get("TETHER_ENABLE_MODEL", "0") == "1"
+# Upper bound on the nodes returned by the graph query endpoints.
+MAX_GRAPH_NODES = 1000
+# Upper bound on the nodes a shortest path search may expand.
+MAX_PATH_EXPANDED = 10_000
 
 
 # Ensure the database tables are created
@@ -17,6 +44,9 @@ async def init_db():
 
 
 app = FastAPI()
+# Set before any route is declared so that every endpoint is timed.
+app.router.route_class = TimedRoute
+instrument_engine(engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,11 +55,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    if ENABLE_MODEL_ENDPOINTS and MODEL_PATH.exists():
+        get_item_model()
 
 
 class Package(BaseModel):
@@ -47,10 +80,13 @@ class Example(BaseModel):
     value: str
 
 
-class Column(BaseModel):
+class ColumnSummary(BaseModel):
     id: int
     name: str
     dataset: Dataset
+
+
+class Column(ColumnSummary):
     examples: list[Example] = []
 
 
@@ -74,11 +110,127 @@ class DomainRelationsResponse(BaseModel):
     edges: list[DomainRelation]
 
 
+class ColumnSample(BaseModel):
+    name: str | None = None
+    values: list[str]
+
+
+class DomainLookupRequest(BaseModel):
+    columns: list[ColumnSample]
+    k: int = Field(default=5, ge=1, le=100)
+
+
+class DomainMatch(BaseModel):
+    domain: Domain
+    distance: float
+
+
+class ColumnDomainMatches(BaseModel):
+    name: str | None = None
+    matches: list[DomainMatch]
+
+
+class SimilarColumn(BaseModel):
+    column: ColumnSummary
+    distance: float
+
+
+class ColumnSearchResult(BaseModel):
+    column: ColumnSummary
+    domain: Domain | None = None
+    score: float
+
+
+class DomainHops(Domain):
+    hops: int
+
+
+class DomainNeighborhood(BaseModel):
+    nodes: list[DomainHops]
+    truncated: bool
+
+
+class DomainPath(BaseModel):
+    nodes: list[Domain]
+    cost: float
+
+
+class DomainSubgraph(BaseModel):
+    nodes: list[Domain]
+    edges: list[DomainRelation]
+    truncated: bool
+
+
+@lru_cache
+def get_item_model():
+    if not ENABLE_MODEL_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Model endpoints are disabled")
+    if not MODEL_PATH.exists():
+        raise HTTPException(status_code=503, detail="Model checkpoint not found")
+
+    from tether.model.item import ItemAutoencoder, load_model
+
+    model = ItemAutoencoder(input_dim=256, hidden_dim=64, input_size=100)
+    return load_model(model, MODEL_PATH)
+
+
+# Artifacts published by the pipeline, with the modification time they were
+# loaded at.
+_artifacts: dict[Path, tuple[float, object]] = {}
+
+
+def cached_artifact(path: Path, loader, detail: str):
+    """
+    Load an artifact published by the pipeline, keeping it in memory until
+    its file is modified, so that a republished artifact (with renumbered ids)
+    replaces the one in memory. A missing artifact is a 503.
+    """
+    try:
+        mtime = path.stat().st_mtime
+        cached = _artifacts.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, loader(path))
+            _artifacts[path] = cached
+        return cached[1]
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail=detail)
+
+
+def get_domain_index() -> DomainIndex:
+    return cached_artifact(
+        OUTPUT_DIR / "domain_index.npz", DomainIndex.load, "Domain index not found"
+    )
+
+
+def get_relation_graph() -> RelationGraph:
+    return cached_artifact(
+        OUTPUT_DIR / "domain_graph.npz", RelationGraph.load, "Domain graph not found"
+    )
+
+
+def get_column_index() -> ColumnIndex:
+    return cached_artifact(
+        OUTPUT_DIR / "column_index", ColumnIndex.load, "Column index not found"
+    )
+
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Tether API!"}
 
 
+@app.get("/metrics")
+async def get_metrics(reset: bool = False):
+    """
+    Latency, handler and serialization time, database queries and response
+    size of every route since startup (or the last reset).
+    """
+    summary = registry.summary()
+    if reset:
+        registry.reset()
+    return summary
+
+
 @app.get("/packages", response_model=list[Package])
 async def get_packages(db: Annotated[AsyncSession, Depends(get_db)]):
     packages = await db.execute(select(models.Package).order_by(models.Package.name))
@@ -113,19 +265,40 @@ async def get_domain(domain_id: int, db: Annotated[AsyncSession, Depends(get_db)
     return domain
 
 
-@app.get("/domain-relations")
+@lru_cache(maxsize=16)
+def read_domain_graph(path: Path, mtime: float) -> bytes:
+    return path.read_bytes()
+
+
+@lru_cache(maxsize=1)
+def read_domain_relations(path: Path, mtime: float):
+    import pandas as pd
+
+    matrix_df = pd.read_csv(path, index_col=0)
+    matrix_df.fillna(0, inplace=True)
+    return matrix_df
+
+
+@app.get("/domain-relations", response_model=DomainRelationsResponse)
 async def get_domain_relations(
     db: Annotated[AsyncSession, Depends(get_db)],
     nlargest: int = 10,
     min_weight: float = 0.5,
     num_examples: int = 10,
 ):
-    matrix_df = pd.read_csv("../data/output/domain_relations.csv", index_col=0)
-    matrix_df.fillna(0, inplace=True)
+    # Serve the graph precomputed by the pipeline for these parameters if
+    # there is one, and only build it from the database otherwise.
+    graph_path = domain_graph_path(OUTPUT_DIR, nlargest, min_weight, num_examples)
+    if graph_path.exists():
+        payload = read_domain_graph(graph_path, graph_path.stat().st_mtime)
+        return StreamingResponse(iter_chunks(payload), media_type="application/json")
+
+    relations_path = OUTPUT_DIR / "domain_relations.csv"
+    matrix_df = read_domain_relations(relations_path, relations_path.stat().st_mtime)
 
     domains = await db.execute(
         select(models.Domain)
-        .where(models.Domain.id.in_(matrix_df.index))
+        .where(models.Domain.id.in_(matrix_df.index.tolist()))
         .options(
             selectinload(models.Domain.columns)
             .selectinload(models.DatasetColumn.dataset)
@@ -134,40 +307,281 @@ async def get_domain_relations(
                 models.DatasetColumn.examples
             ),
         )
-        .order_by(models.Domain.name)
     )
 
-    domains = domains.scalars().all()
-    for domain in domains:
-        for column in domain.columns:
-            column.examples = column.examples[:num_examples]
-
-    relations = {}
-    for domain_id in matrix_df.index:
-        if domain_id not in relations:
-            relations[domain_id] = []
-
-        sorted_relations = matrix_df.loc[domain_id].nlargest(nlargest)
-        for related_domain_id, score in sorted_relations.items():
-            if related_domain_id != domain_id:
-                relations[domain_id].append(
-                    {
-                        "related_domain_id": related_domain_id,
-                        "score": score,
-                    }
-                )
-
-    edges = []
-    for domain_id, related_domains in relations.items():
-        for relation in related_domains:
-            if relation["score"] < min_weight:
-                continue
-            edges.append(
+    # Order as the precomputed graphs are, whatever the dialect's NULL order.
+    domains = sorted(domains.scalars().all(), key=lambda d: domain_sort_key(d.name))
+    nodes = [
+        {
+            "id": domain.id,
+            "name": domain.name,
+            "columns": [
                 {
-                    "source": str(domain_id),
-                    "target": str(relation["related_domain_id"]),
-                    "weight": relation["score"],
+                    "id": column.id,
+                    "name": column.name,
+                    "dataset": column.dataset,
+                    "examples": sorted(column.examples, key=lambda e: e.id)[
+                        :num_examples
+                    ],
                 }
+                for column in sorted(domain.columns, key=lambda c: c.id)
+            ],
+        }
+        for domain in domains
+    ]
+    edges = domain_relation_edges(matrix_df, nlargest, min_weight)
+
+    return {"nodes": nodes, "edges": edges}
+
+
+@app.get("/columns/{column_id}/similar", response_model=list[SimilarColumn])
+async def get_similar_columns(
+    column_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    index: Annotated[ColumnIndex, Depends(get_column_index)],
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+):
+    gaussian = index.get(column_id)
+    if gaussian is None:
+        raise HTTPException(status_code=404, detail="Column not found")
+
+    similar = index.query(gaussian, k=k, exclude=column_id)
+
+    columns = await db.execute(
+        select(models.DatasetColumn)
+        .where(models.DatasetColumn.id.in_([i for i, _ in similar]))
+        .options(
+            selectinload(models.DatasetColumn.dataset).selectinload(
+                models.Dataset.package
             )
+        )
+    )
+    columns = {column.id: column for column in columns.scalars().all()}
+
+    return [
+        {"column": columns[similar_id], "distance": distance}
+        for similar_id, distance in similar
+        if similar_id in columns
+    ]
+
+
+async def get_domain_names(db: AsyncSession, domain_ids: list[int]) -> dict:
+    domains = await db.execute(
+        select(models.Domain.id, models.Domain.name).where(
+            models.Domain.id.in_(domain_ids)
+        )
+    )
+    return dict(domains.all())
+
+
+def get_graph_position(graph: RelationGraph, domain_id: int) -> int:
+    position = graph.position(domain_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail=f"Domain {domain_id} not found")
+    return position
+
+
+@app.get("/graph/neighborhood/{domain_id}", response_model=DomainNeighborhood)
+async def get_domain_neighborhood(
+    domain_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    graph: Annotated[RelationGraph, Depends(get_relation_graph)],
+    hops: Annotated[int, Query(ge=1)] = 2,
+    min_weight: float = 0.5,
+    limit: Annotated[int, Query(ge=1)] = 100,
+):
+    # Searches are pure Python, so run them in the threadpool like
+    # /graph/path rather than blocking the event loop.
+    hop_counts, truncated = await run_in_threadpool(
+        graph.bfs,
+        get_graph_position(graph, domain_id),
+        max_hops=hops,
+        min_weight=min_weight,
+        max_nodes=min(limit, MAX_GRAPH_NODES),
+    )
+    ids = [int(graph.ids[node]) for node in hop_counts]
+    names = await get_domain_names(db, ids)
+
+    return {
+        "nodes": [
+            {"id": node_id, "name": names.get(node_id), "hops": hop}
+            for node_id, hop in zip(ids, hop_counts.values())
+        ],
+        "truncated": truncated,
+    }
+
+
+@app.get("/graph/path", response_model=DomainPath)
+async def get_domain_path(
+    source: int,
+    target: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    graph: Annotated[RelationGraph, Depends(get_relation_graph)],
+    min_weight: float = 0.5,
+    max_expanded: Annotated[int, Query(ge=1, le=MAX_PATH_EXPANDED)] = 1000,
+):
+    # The search is pure Python and can take tens of milliseconds, so run it
+    # in the threadpool rather than blocking the event loop.
+    result = await run_in_threadpool(
+        graph.shortest_path,
+        get_graph_position(graph, source),
+        get_graph_position(graph, target),
+        min_weight=min_weight,
+        max_expanded=max_expanded,
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="No path between the domains")
+
+    path, cost = result
+    ids = [int(graph.ids[node]) for node in path]
+    names = await get_domain_names(db, ids)
+
+    return {
+        "nodes": [{"id": node_id, "name": names.get(node_id)} for node_id in ids],
+        "cost": cost,
+    }
+
+
+@app.get("/graph/ego/{domain_id}", response_model=DomainSubgraph)
+async def get_domain_subgraph(
+    domain_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    graph: Annotated[RelationGraph, Depends(get_relation_graph)],
+    radius: Annotated[int, Query(ge=1)] = 1,
+    min_weight: float = 0.5,
+    max_nodes: Annotated[int, Query(ge=1)] = 200,
+    max_edges: Annotated[int, Query(ge=1)] = 2000,
+):
+    nodes, edges, truncated = await run_in_threadpool(
+        graph.ego_subgraph,
+        get_graph_position(graph, domain_id),
+        radius=radius,
+        min_weight=min_weight,
+        max_nodes=min(max_nodes, MAX_GRAPH_NODES),
+        max_edges=min(max_edges, 10 * MAX_GRAPH_NODES),
+    )
+    ids = [int(graph.ids[node]) for node in nodes]
+    names = await get_domain_names(db, ids)
+
+    return {
+        "nodes": [{"id": node_id, "name": names.get(node_id)} for node_id in ids],
+        "edges": [
+            {
+                "source": str(graph.ids[source]),
+                "target": str(graph.ids[target]),
+                "weight": weight,
+            }
+            for source, target, weight in edges
+        ],
+        "truncated": truncated,
+    }
+
+
+# The in-process search index and the publication it was built from.
+_search_index: tuple[float | None, ColumnSearchIndex] | None = None
+
+
+async def get_search_index(db: AsyncSession) -> ColumnSearchIndex:
+    """
+    Build the in-process search index from the database on first use, and
+    again whenever the metadata has been republished since.
+    """
+    global _search_index
+    published_at = await db.scalar(select(func.max(models.Publication.published_at)))
+    if _search_index is None or _search_index[0] != published_at:
+        index = ColumnSearchIndex()
+        names = await db.execute(
+            select(models.DatasetColumn.id, models.DatasetColumn.name)
+        )
+        for column_id, name in names:
+            index.add_column(column_id, name)
+        examples = await db.execute(
+            select(models.Example.column_id, models.Example.value)
+        )
+        for column_id, value in examples:
+            index.add_example(column_id, value)
+        _search_index = (published_at, index)
+    return _search_index[1]
+
+
+@app.get("/search", response_model=list[ColumnSearchResult])
+async def search_columns(
+    q: str,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    # Postgres answers with its trigram indexes; other databases (SQLite in
+    # development and tests) with an equivalent in-process index.
+    if engine.dialect.name == "postgresql":
+        matches = await db.execute(
+            text(
+                """
+                SELECT column_id, max(score) AS score FROM (
+                    SELECT id AS column_id, word_similarity(:q, name) AS score
+                    FROM columns WHERE :q <% name
+                    UNION ALL
+                    SELECT column_id, word_similarity(:q, value) AS score
+                    FROM examples WHERE :q <% value
+                ) AS matches
+                GROUP BY column_id
+                ORDER BY score DESC, column_id
+                LIMIT :limit
+                """
+            ),
+            {"q": q, "limit": limit},
+        )
+        matches = [(column_id, score) for column_id, score in matches]
+    else:
+        index = await get_search_index(db)
+        matches = index.search(q, limit=limit)
+
+    columns = await db.execute(
+        select(models.DatasetColumn)
+        .where(models.DatasetColumn.id.in_([column_id for column_id, _ in matches]))
+        .options(
+            selectinload(models.DatasetColumn.dataset).selectinload(
+                models.Dataset.package
+            ),
+            selectinload(models.DatasetColumn.domain),
+        )
+    )
+    columns = {column.id: column for column in columns.scalars().all()}
+
+    return [
+        {
+            "column": columns[column_id],
+            "domain": columns[column_id].domain,
+            "score": score,
+        }
+        for column_id, score in matches
+        if column_id in columns
+    ]
+
+
+# Defined without async so that encoding runs in the threadpool rather than
+# blocking the event loop.
+@app.post("/domains/lookup", response_model=list[ColumnDomainMatches])
+def lookup_column_domains(
+    request: DomainLookupRequest,
+    index: Annotated[DomainIndex, Depends(get_domain_index)],
+):
+    model = get_item_model()
+    names = dict(zip(index.ids.tolist(), index.names.tolist()))
+
+    results = []
+    for column in request.columns:
+        matches = lookup_domains(model, index, column.values, k=request.k)
+        results.append(
+            {
+                "name": column.name,
+                "matches": [
+                    {
+                        "domain": {"id": domain_id, "name": names[domain_id] or None},
+                        "distance": distance,
+                    }
+                    for domain_id, distance in matches
+                ],
+            }
+        )
 
-    return {"nodes": domains, "edges": edges}
+    return results
@@ -0,0 +1,292 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+import asyncio
+import threading
+import time
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Bucket upper bounds; anything larger falls into a final overflow bucket.
+LATENCY_BOUNDS_MS = (
+    0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+COUNT_BOUNDS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100)
+SIZE_BOUNDS_BYTES = tuple(2**i for i in range(6, 27, 2))  # 64 B to 64 MiB
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Quantiles are estimated by interpolating within
+    the bucket they fall in, so they are only as precise as the buckets.
+    """
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.bounds, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+@dataclass
+class RequestStats:
+    """
+    Measurements of the request being handled, filled in by the middleware,
+    the route class and the database hooks.
+    """
+
+    start: float
+    handler_ms: float = 0.0
+    handler_end: float | None = None
+    queries: int = 0
+    query_ms: float = 0.0
+
+
+@dataclass
+class RouteMetrics:
+    latency_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BOUNDS_MS))
+    handler_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BOUNDS_MS))
+    serialization_ms: Histogram = field(
+        default_factory=lambda: Histogram(LATENCY_BOUNDS_MS)
+    )
+    queries: Histogram = field(default_factory=lambda: Histogram(COUNT_BOUNDS))
+    query_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BOUNDS_MS))
+    response_bytes: Histogram = field(
+        default_factory=lambda: Histogram(SIZE_BOUNDS_BYTES)
+    )
+    statuses: dict[int, int] = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        return {
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "latency_ms": self.latency_ms.summary(),
+            "handler_ms": self.handler_ms.summary(),
+            "serialization_ms": self.serialization_ms.summary(),
+            "queries": self.queries.summary(),
+            "query_ms": self.query_ms.summary(),
+            "response_bytes": self.response_bytes.summary(),
+        }
+
+
+class MetricsRegistry:
+    """
+    Per-route request metrics, keyed by method and route template so that
+    /domains/1 and /domains/2 are aggregated together.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes: dict[str, RouteMetrics] = {}
+        self.started = time.time()
+
+    def record(
+        self,
+        route: str,
+        status: int,
+        stats: RequestStats,
+        end: float,
+        response_start: float | None,
+        response_bytes: int,
+    ) -> None:
+        with self.lock:
+            metrics = self.routes.setdefault(route, RouteMetrics())
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency_ms.observe((end - stats.start) * 1000)
+            metrics.queries.observe(stats.queries)
+            metrics.query_ms.observe(stats.query_ms)
+            metrics.response_bytes.observe(response_bytes)
+            if stats.handler_end is not None:
+                metrics.handler_ms.observe(stats.handler_ms)
+                # Response model validation and JSON encoding happen between
+                # the endpoint returning and the response starting.
+                if response_start is not None:
+                    metrics.serialization_ms.observe(
+                        max(response_start - stats.handler_end, 0.0) * 1000
+                    )
+
+    def reset(self) -> None:
+        with self.lock:
+            self.routes = {}
+            self.started = time.time()
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "uptime_s": time.time() - self.started,
+                "routes": {
+                    route: metrics.summary()
+                    for route, metrics in sorted(self.routes.items())
+                },
+            }
+
+
+registry = MetricsRegistry()
+current_request: ContextVar[RequestStats | None] = ContextVar(
+    "current_request", default=None
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and response size of every
+    HTTP request. Sizes are counted from the body messages actually sent, so
+    streamed responses are measured too. Requests to the routes in exclude,
+    such as /metrics itself, are not recorded, so that reading or resetting
+    the metrics does not show up in them.
+    """
+
+    def __init__(
+        self,
+        app,
+        registry: MetricsRegistry = registry,
+        exclude: tuple[str, ...] = ("/metrics",),
+    ):
+        self.app = app
+        self.registry = registry
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(start=time.perf_counter())
+        token = current_request.set(stats)
+        status = 500
+        response_start = None
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_start, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_start = time.perf_counter()
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            # The router stores the matched route in the scope; unmatched
+            # requests are grouped together.
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            if path not in self.exclude:
+                self.registry.record(
+                    f"{scope['method']} {path}",
+                    status,
+                    stats,
+                    time.perf_counter(),
+                    response_start,
+                    response_bytes,
+                )
+
+
+def timed(endpoint):
+    """
+    Wrap an endpoint to record its run time in the current request's stats,
+    keeping its signature for FastAPI and whether it is a coroutine.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            stats = current_request.get()
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if stats is not None:
+                    stats.handler_end = time.perf_counter()
+                    stats.handler_ms += (stats.handler_end - start) * 1000
+
+    else:
+
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            stats = current_request.get()
+            start = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if stats is not None:
+                    stats.handler_end = time.perf_counter()
+                    stats.handler_ms += (stats.handler_end - start) * 1000
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    Route class timing the endpoint function on its own, so that request
+    latency can be split into handler and serialization time.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, timed(endpoint), **kwargs)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Count the queries executed on an engine and their time, attributing them
+    to the request they run in.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_ms += duration * 1000
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute.
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
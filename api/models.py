@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Float, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from api.db import Base
@@ -54,3 +54,10 @@ class Example(Base):
     column_id = Column(Integer, ForeignKey("columns.id"), nullable=False)
 
     column = relationship("DatasetColumn", back_populates="examples")
+
+
+class Publication(Base):
+    __tablename__ = "publications"
+
+    id = Column(Integer, primary_key=True)
+    published_at = Column(Float, nullable=False)
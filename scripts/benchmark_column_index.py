@@ -0,0 +1,85 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from tether.model.cluster import ColumnGaussian, gaussian_distances
+from tether.model.index import ColumnIndex
+
+
+def make_gaussians(num_columns: int, num_domains: int, dim: int, seed: int = 0):
+    """
+    Synthetic column Gaussians drawn around a set of domain centres.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=1.0, size=(num_domains, dim)).astype(np.float32)
+    domains = rng.integers(num_domains, size=num_columns)
+    means = centres[domains] + rng.normal(scale=0.2, size=(num_columns, dim))
+    covariances = rng.uniform(1e-3, 5e-2, size=(num_columns, dim))
+    return means.astype(np.float32), covariances.astype(np.float32)
+
+
+def percentiles(timings):
+    timings = np.array(timings) * 1000
+    return f"p50 {np.percentile(timings, 50):6.2f} ms, p99 {np.percentile(timings, 99):6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark column-to-column similarity search"
+    )
+    parser.add_argument("--num-columns", type=int, default=60000)
+    parser.add_argument("--num-domains", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    means, covariances = make_gaussians(args.num_columns, args.num_domains, args.dim)
+    gaussians = [ColumnGaussian(mean=m, covariance=c) for m, c in zip(means, covariances)]
+    ids = np.arange(1, args.num_columns + 1)
+
+    start = time.perf_counter()
+    index = ColumnIndex.build(gaussians, ids)
+    print(
+        f"Built index over {len(index)} columns with {len(index.centroids)} lists "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+    rng = np.random.default_rng(1)
+    query_ids = rng.choice(ids, size=args.queries, replace=False)
+
+    with tempfile.TemporaryDirectory() as path:
+        index.save(path)
+        start = time.perf_counter()
+        index = ColumnIndex.load(path, mmap=True)
+        print(f"Loaded index with mmap in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        exact_timings, ivf_timings, recalls = [], [], []
+        for column_id in query_ids:
+            gaussian = index.get(column_id)
+
+            start = time.perf_counter()
+            distances = gaussian_distances(
+                gaussian.mean, gaussian.covariance, means, covariances
+            )
+            distances[column_id - 1] = np.inf
+            exact = set(ids[np.argsort(distances)[: args.k]].tolist())
+            exact_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            result = index.query(
+                gaussian, k=args.k, nprobe=args.nprobe, exclude=column_id
+            )
+            ivf_timings.append(time.perf_counter() - start)
+
+            recalls.append(len(exact & {i for i, _ in result}) / args.k)
+
+    print(f"exact scan: {percentiles(exact_timings)}")
+    print(f"ivf index:  {percentiles(ivf_timings)}")
+    print(f"recall@{args.k}: {np.mean(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    main()
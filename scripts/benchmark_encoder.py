@@ -0,0 +1,84 @@
+import argparse
+import random
+import string
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from tether.model.item import ItemAutoencoder, encode_items, load_model, process_ascii
+
+
+def make_items(num_items: int, seed: int = 0) -> list[str]:
+    """
+    Generate items with a length profile similar to Open Data string columns:
+    mostly short codes and names, with a tail of longer free text.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + " "
+    items = []
+    for _ in range(num_items):
+        length = min(int(rng.lognormvariate(2.0, 0.8)) + 1, 150)
+        items.append("".join(rng.choices(alphabet, k=length)))
+    return items
+
+
+def benchmark(model, items, packed, batch_size, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encoded = encode_items(model, items, batch_size=batch_size, packed=packed)
+        timings.append(time.perf_counter() - start)
+    return encoded, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare padded and packed encoder throughput"
+    )
+    parser.add_argument("--num-items", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--model-path",
+        type=str,
+        default="tether/checkpoints/item_autoencoder.pth",
+        help="Path to the pre-trained model checkpoint",
+    )
+    args = parser.parse_args()
+
+    model = ItemAutoencoder(input_dim=256, hidden_dim=64, input_size=100)
+    if Path(args.model_path).exists():
+        model = load_model(model, args.model_path)
+    else:
+        print(f"Model checkpoint not found at {args.model_path}, using random weights.")
+        model.eval()
+
+    items = make_items(args.num_items)
+    lengths = np.array([len(item) for item in items])
+    print(
+        f"{len(items)} items, mean length {lengths.mean():.1f}, "
+        f"median {np.median(lengths):.0f}, max {lengths.max()}"
+    )
+
+    exact, exact_time = benchmark(
+        model, items, packed=False, batch_size=args.batch_size, repeats=args.repeats
+    )
+    packed, packed_time = benchmark(
+        model, items, packed=True, batch_size=args.batch_size, repeats=args.repeats
+    )
+
+    # The padded path must match the original single-batch encoder output.
+    with torch.no_grad():
+        sample = items[:256]
+        reference = model.encoder(torch.from_numpy(process_ascii(sample))).numpy()
+    exact_error = np.abs(exact[:256] - reference).max()
+
+    print(f"padded: {len(items) / exact_time:10.0f} items/s ({exact_time:.2f}s)")
+    print(f"packed: {len(items) / packed_time:10.0f} items/s ({packed_time:.2f}s)")
+    print(f"speedup: {exact_time / packed_time:.1f}x")
+    print(f"padded vs. original encoder, max abs difference: {exact_error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import time
+
+import numpy as np
+from tether.model.graph import RelationGraph
+
+
+def make_graph(num_nodes: int, degree: int, seed: int = 0) -> RelationGraph:
+    """
+    Random undirected graph with PPMI-like weights: a few strong relations
+    per node and a long tail of weak ones.
+    """
+    rng = np.random.default_rng(seed)
+    num_edges = num_nodes * degree // 2
+    sources = rng.integers(num_nodes, size=num_edges)
+    targets = rng.integers(num_nodes, size=num_edges)
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    weights = rng.exponential(0.4, size=len(sources))
+
+    return RelationGraph.from_edges(
+        np.arange(1, num_nodes + 1),
+        np.concatenate([sources, targets]),
+        np.concatenate([targets, sources]),
+        np.concatenate([weights, weights]),
+    )
+
+
+def report(name, timings):
+    timings = np.array(timings) * 1000
+    print(
+        f"{name:28s} p50 {np.percentile(timings, 50):7.2f} ms, "
+        f"p99 {np.percentile(timings, 99):7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark domain graph queries")
+    parser.add_argument("--num-nodes", type=int, default=50000)
+    parser.add_argument("--degree", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--min-weight", type=float, default=0.7)
+    parser.add_argument(
+        "--max-expanded",
+        type=int,
+        default=1000,
+        help="Expansion limit of the shortest path search (the API default)",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = make_graph(args.num_nodes, args.degree)
+    print(
+        f"Built graph with {len(graph)} nodes and {graph.num_edges} edges "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+    rng = np.random.default_rng(1)
+    sources = rng.integers(len(graph), size=args.queries)
+    targets = rng.integers(len(graph), size=args.queries)
+
+    timings = []
+    for source in sources:
+        start = time.perf_counter()
+        graph.bfs(source, max_hops=2, min_weight=args.min_weight, max_nodes=1000)
+        timings.append(time.perf_counter() - start)
+    report("2-hop neighborhood", timings)
+
+    timings = []
+    for source in sources:
+        start = time.perf_counter()
+        graph.ego_subgraph(source, radius=1, min_weight=args.min_weight)
+        timings.append(time.perf_counter() - start)
+    report("ego subgraph (radius 1)", timings)
+
+    timings = []
+    found = 0
+    for source, target in zip(sources, targets):
+        start = time.perf_counter()
+        found += (
+            graph.shortest_path(
+                source,
+                target,
+                min_weight=args.min_weight,
+                max_expanded=args.max_expanded,
+            )
+            is not None
+        )
+        timings.append(time.perf_counter() - start)
+    report("weighted shortest path", timings)
+    print(f"paths found: {found}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "sklearn", "pandas", "sqlalchemy")
+
+# What each entry point may not import. Run from the repository root; the
+# repository has no test suite, so this script is the check to run (and fails
+# with a non-zero exit status) after changing imports.
+TARGETS = {
+    "import tether.dataset.repository": ("torch", "sklearn", "pandas"),
+    "import tether.model.cluster": ("torch", "sklearn", "pandas"),
+    "import tether.model.graph": ("torch", "sklearn", "pandas"),
+    "import tether.model.index": ("torch", "sklearn", "pandas"),
+    "import tether.model.relation": ("torch", "sklearn", "pandas"),
+    "import tether.utils.database": ("torch", "sklearn", "pandas", "sqlalchemy"),
+    "import tether.utils.payload": ("torch", "sklearn", "pandas", "sqlalchemy"),
+    "import tether.utils.search": ("torch", "sklearn", "pandas", "sqlalchemy"),
+    "import tether.utils.shard": ("torch", "sklearn", "pandas", "sqlalchemy"),
+    "import api.main": ("torch", "sklearn"),
+    "scripts/save_metadata.py --help": ("torch", "sklearn", "pandas"),
+}
+
+
+def import_times(target: str) -> tuple[float, dict[str, float]]:
+    """
+    Run a target under `python -X importtime` and return its total import
+    time and the cumulative time of every module it imported, in ms.
+    """
+    if target.startswith("import "):
+        command = [sys.executable, "-X", "importtime", "-c", target]
+    else:
+        command = [sys.executable, "-X", "importtime", *target.split()]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{target} failed:\n{result.stderr}")
+
+    total = 0.0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        cumulative = int(cumulative) / 1000
+        modules[name.strip()] = cumulative
+        # Top-level imports are indented by a single space.
+        if len(name) - len(name.lstrip()) == 1:
+            total += cumulative
+
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure import time of the CLI and API entry points and "
+        "check that they do not import heavy dependencies"
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Also fail if any entry point takes longer than this to import",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for target, forbidden in TARGETS.items():
+        total, modules = import_times(target)
+        heavy = {name: modules[name] for name in HEAVY_MODULES if name in modules}
+        heavy_str = ", ".join(f"{name} {ms:.0f} ms" for name, ms in heavy.items())
+        print(f"{target:40s} {total:8.0f} ms  {heavy_str}")
+
+        failures.extend(f"{target} imports {name}" for name in forbidden if name in heavy)
+        if args.max_ms is not None and total > args.max_ms:
+            failures.append(f"{target} took {total:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+# The API package lives next to tether at the repository root.
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tether.utils.database import save_metadata_to_db
+from tether.utils.payload import GRAPH_PARAMETERS, save_domain_graphs
+
+WORDS = [
+    "station", "county", "price", "species", "date", "code", "name", "rate",
+    "region", "total", "weight", "city", "year", "category", "status", "id",
+]
+
+
+def make_metadata(
+    num_packages: int,
+    datasets_per_package: int,
+    columns_per_dataset: int,
+    num_domains: int,
+    examples_per_column: int,
+    seed: int = 0,
+) -> tuple:
+    """
+    Synthetic tables in the layout of make_metadata_for_db.
+    """
+    rng = random.Random(seed)
+
+    packages_db = pd.DataFrame(
+        {
+            "id": range(1, num_packages + 1),
+            "name": [f"package_{i}" for i in range(1, num_packages + 1)],
+        }
+    )
+
+    num_datasets = num_packages * datasets_per_package
+    datasets_db = pd.DataFrame(
+        {
+            "id": range(1, num_datasets + 1),
+            "name": [f"dataset_{i}" for i in range(1, num_datasets + 1)],
+            "package_id": [
+                i // datasets_per_package + 1 for i in range(num_datasets)
+            ],
+        }
+    )
+
+    domains_db = pd.DataFrame(
+        {
+            "id": range(1, num_domains + 1),
+            "name": [f"{rng.choice(WORDS)}_{i}" for i in range(1, num_domains + 1)],
+        }
+    )
+
+    num_columns = num_datasets * columns_per_dataset
+    columns_db = pd.DataFrame(
+        {
+            "id": range(1, num_columns + 1),
+            "name": [
+                f"{rng.choice(WORDS)}_{rng.choice(WORDS)}" for _ in range(num_columns)
+            ],
+            "dataset_id": [
+                i // columns_per_dataset + 1 for i in range(num_columns)
+            ],
+            "domain_id": [rng.randint(1, num_domains) for _ in range(num_columns)],
+        }
+    )
+
+    examples_db = pd.DataFrame(
+        [
+            {
+                "id": (column_id - 1) * examples_per_column + j,
+                "column_id": column_id,
+                "value": f"{rng.choice(WORDS)} {rng.randint(0, 10**6)}",
+            }
+            for column_id in columns_db.id
+            for j in range(examples_per_column)
+        ],
+        columns=["id", "column_id", "value"],
+    )
+
+    return packages_db, datasets_db, domains_db, columns_db, examples_db
+
+
+def make_relations(domain_ids: list[int], seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    matrix = rng.exponential(0.3, size=(len(domain_ids), len(domain_ids)))
+    matrix = (matrix + matrix.T) / 2
+    return pd.DataFrame(matrix, index=domain_ids, columns=[str(i) for i in domain_ids])
+
+
+def make_requests(args, metadata_db: tuple, rng: random.Random) -> list[str]:
+    _, _, domains_db, columns_db, _ = metadata_db
+    domain_ids = domains_db.id.tolist()
+    queries = [f"{word[:-1]}" for word in WORDS] + columns_db.name.head(50).tolist()
+
+    requests = []
+    for _ in range(args.requests):
+        kind = rng.choices(
+            ["packages", "domains", "domain", "relations", "search"],
+            weights=[1, 1, 4, 2, 2],
+        )[0]
+        if kind == "packages":
+            requests.append("/packages")
+        elif kind == "domains":
+            requests.append("/domains")
+        elif kind == "domain":
+            requests.append(f"/domains/{rng.choice(domain_ids)}")
+        elif kind == "relations":
+            params = rng.choice(GRAPH_PARAMETERS)
+            requests.append(f"/domain-relations?{urlencode(params)}")
+        else:
+            requests.append(f"/search?{urlencode({'q': rng.choice(queries)})}")
+    return requests
+
+
+async def run(client, requests: list[str], concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def fetch(path):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{path} failed with {response.status_code}")
+
+    await asyncio.gather(*(fetch(path) for path in requests))
+    return latencies
+
+
+def seed_app(args, metadata_db: tuple, tmp_dir: Path):
+    """
+    Seed a SQLite database and the pipeline outputs in tmp_dir, and return a
+    client of the API serving them in process.
+    """
+    import httpx
+
+    db_path = tmp_dir / "tether.db"
+
+    start = time.perf_counter()
+    save_metadata_to_db(*metadata_db, db_url=f"sqlite:///{db_path}")
+    matrix_df = make_relations(metadata_db[2].id.tolist(), seed=args.seed)
+    matrix_df.to_csv(tmp_dir / "domain_relations.csv")
+    if args.precomputed:
+        save_domain_graphs(tmp_dir, matrix_df, metadata_db)
+    print(
+        f"Seeded {len(metadata_db[3])} columns and {len(metadata_db[4])} "
+        f"examples in {db_path} ({time.perf_counter() - start:.1f}s)"
+    )
+
+    # The API reads its configuration when it is imported.
+    os.environ["TETHER_DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["TETHER_OUTPUT_DIR"] = str(tmp_dir)
+    os.environ["TETHER_DATABASE_ECHO"] = "0"
+    from api.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://tether",
+        timeout=60,
+    )
+
+
+def print_metrics(metrics: dict) -> None:
+    header = (
+        f"{'route':34s} {'n':>6s} {'p50 ms':>8s} {'p99 ms':>8s} {'handler':>8s} "
+        f"{'serial.':>8s} {'queries':>8s} {'query ms':>9s} {'KiB':>8s}"
+    )
+    print(header)
+    print("-" * len(header))
+    for route, m in metrics["routes"].items():
+        print(
+            f"{route:34s} {m['latency_ms']['count']:6d} "
+            f"{m['latency_ms']['p50']:8.2f} {m['latency_ms']['p99']:8.2f} "
+            f"{m['handler_ms']['mean']:8.2f} {m['serialization_ms']['mean']:8.2f} "
+            f"{m['queries']['mean']:8.1f} {m['query_ms']['mean']:9.2f} "
+            f"{m['response_bytes']['mean'] / 1024:8.1f}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the API against a seeded SQLite database, or "
+        "against a running server with --url, and report its /metrics"
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="Base URL of a running API to test instead of seeding one",
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--packages", type=int, default=20)
+    parser.add_argument("--datasets-per-package", type=int, default=10)
+    parser.add_argument("--columns-per-dataset", type=int, default=8)
+    parser.add_argument("--domains", type=int, default=100)
+    parser.add_argument("--examples-per-column", type=int, default=10)
+    parser.add_argument(
+        "--precomputed",
+        action="store_true",
+        help="Also write the precomputed /domain-relations payloads",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import httpx
+
+    rng = random.Random(args.seed)
+    metadata_db = make_metadata(
+        args.packages,
+        args.datasets_per_package,
+        args.columns_per_dataset,
+        args.domains,
+        args.examples_per_column,
+        seed=args.seed,
+    )
+    requests = make_requests(args, metadata_db, rng)
+
+    with tempfile.TemporaryDirectory(prefix="tether-load-test-") as tmp_dir:
+        if args.url is not None:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            client = seed_app(args, metadata_db, Path(tmp_dir))
+
+        async with client:
+            # Warm up caches and connections, then measure from a clean slate.
+            await run(client, requests[: args.concurrency * 4], args.concurrency)
+            await client.get("/metrics", params={"reset": True})
+
+            start = time.perf_counter()
+            latencies = await run(client, requests, args.concurrency)
+            elapsed = time.perf_counter() - start
+
+            metrics = (await client.get("/metrics")).json()
+
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{len(requests)} requests at concurrency {args.concurrency} in "
+        f"{elapsed:.1f}s ({len(requests) / elapsed:.0f} req/s), client p50 "
+        f"{np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms\n"
+    )
+    print_metrics(metrics)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+from tether.utils.files import atomic_write
+
+
+def pack_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pack strings into one UTF-8 byte array and an array of offsets.
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(data: np.ndarray, offsets: np.ndarray) -> list[str]:
+    blob = data.tobytes()
+    offsets = offsets.tolist()
+
+    # Byte offsets are also character offsets when everything is ASCII, which
+    # saves decoding each string separately.
+    text = blob.decode("utf-8")
+    if len(text) == len(blob):
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+    return [
+        blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])
+    ]
+
+
+@dataclass
+class Catalog:
+    """
+    Array-backed tables of the packages, datasets and columns of a repository,
+    addressed by integer ids (their row number).
+
+    Datasets are grouped by package and columns by dataset, so the datasets of
+    package p are rows package_offsets[p]:package_offsets[p + 1] and the
+    columns of dataset d are rows dataset_offsets[d]:dataset_offsets[d + 1].
+    Column names are kept packed (see pack_strings) and only decoded when the
+    columns of a dataset are read.
+    """
+
+    package_names: list[str]
+    dataset_ids: list[str]
+    column_data: np.ndarray
+    column_offsets: np.ndarray
+    package_offsets: np.ndarray
+    dataset_offsets: np.ndarray
+
+    def __post_init__(self):
+        self.dataset_packages = np.repeat(
+            np.arange(len(self.package_names), dtype=np.int32),
+            np.diff(self.package_offsets),
+        )
+        self.package_index = {name: i for i, name in enumerate(self.package_names)}
+        self.dataset_index = {
+            dataset_id: i for i, dataset_id in enumerate(self.dataset_ids)
+        }
+
+    @property
+    def num_columns(self) -> int:
+        return len(self.column_offsets) - 1
+
+    def package_datasets(self, package: int) -> range:
+        return range(self.package_offsets[package], self.package_offsets[package + 1])
+
+    def dataset_columns(self, dataset: int) -> list[str]:
+        start, end = self.dataset_offsets[dataset], self.dataset_offsets[dataset + 1]
+        offsets = self.column_offsets[start : end + 1]
+        return unpack_strings(
+            self.column_data[offsets[0] : offsets[-1]], offsets - offsets[0]
+        )
+
+    def head(self, num_datasets: int) -> "Catalog":
+        """
+        The catalog cut after its first num_datasets datasets, keeping the
+        packages up to the one the last dataset belongs to.
+        """
+        if num_datasets >= len(self.dataset_ids):
+            return self
+
+        num_packages = int(
+            np.searchsorted(self.package_offsets[:-1], num_datasets, side="left")
+        )
+        num_columns = self.dataset_offsets[num_datasets]
+        return Catalog(
+            package_names=self.package_names[:num_packages],
+            dataset_ids=self.dataset_ids[:num_datasets],
+            column_data=self.column_data[: self.column_offsets[num_columns]],
+            column_offsets=self.column_offsets[: num_columns + 1],
+            package_offsets=np.minimum(
+                self.package_offsets[: num_packages + 1], num_datasets
+            ),
+            dataset_offsets=self.dataset_offsets[: num_datasets + 1],
+        )
+
+    @classmethod
+    def from_metadata(
+        cls, package_datasets: dict[str, list[str]], columns: dict[str, list[str]]
+    ) -> "Catalog":
+        """
+        Build a catalog from package names mapped to their dataset ids, and
+        dataset ids mapped to their column names.
+        """
+        package_names = list(package_datasets)
+        dataset_ids = []
+        column_names = []
+        package_offsets = [0]
+        dataset_offsets = [0]
+
+        for name in package_names:
+            for dataset_id in package_datasets[name]:
+                dataset_ids.append(dataset_id)
+                column_names.extend(columns.get(dataset_id, []))
+                dataset_offsets.append(len(column_names))
+            package_offsets.append(len(dataset_ids))
+
+        column_data, column_offsets = pack_strings(column_names)
+        return cls(
+            package_names=package_names,
+            dataset_ids=dataset_ids,
+            column_data=column_data,
+            column_offsets=column_offsets,
+            package_offsets=np.array(package_offsets, dtype=np.int64),
+            dataset_offsets=np.array(dataset_offsets, dtype=np.int64),
+        )
+
+    def save(self, path: Path) -> None:
+        tables = {}
+        for name in ("package_names", "dataset_ids"):
+            data, offsets = pack_strings(getattr(self, name))
+            tables[f"{name}_data"] = data
+            tables[f"{name}_offsets"] = offsets
+
+        # Several workers may share a catalog path, so never let them read a
+        # partially written one.
+        atomic_write(
+            path,
+            lambda f: np.savez(
+                f,
+                column_names_data=self.column_data,
+                column_names_offsets=self.column_offsets,
+                package_offsets=self.package_offsets,
+                dataset_offsets=self.dataset_offsets,
+                **tables,
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "Catalog":
+        with np.load(path) as data:
+            return cls(
+                **{
+                    name: unpack_strings(data[f"{name}_data"], data[f"{name}_offsets"])
+                    for name in ("package_names", "dataset_ids")
+                },
+                column_data=data["column_names_data"],
+                column_offsets=data["column_names_offsets"],
+                package_offsets=data["package_offsets"],
+                dataset_offsets=data["dataset_offsets"],
+            )
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Iterator
+from tether.dataset.catalog import Catalog
 from tether.dataset.source import DataSource, Package, Dataset, Column
 from tqdm import tqdm
 
@@ -10,23 +12,33 @@ class DataRepository:
     packages: dict[str, Package] = None
     datasets: dict[str, Dataset] = None
     columns: dict[str, dict[str, Column]] = None
+    package_datasets: dict[str, list[str]] = None
+    # Set by load_catalog, and used instead of the dicts above when present.
+    catalog: Catalog = None
 
-    def load_all_metadata(self, max_datasets=None) -> None:
-        """
-        Load all metadata from the data source.
-        """
+    def _init_metadata(self) -> None:
         if self.packages is None:
             self.packages = {}
         if self.datasets is None:
             self.datasets = {}
         if self.columns is None:
             self.columns = {}
+        if self.package_datasets is None:
+            self.package_datasets = {}
+
+    def load_all_metadata(self, max_datasets=None) -> None:
+        """
+        Load all metadata from the data source.
+        """
+        self._init_metadata()
+        self.catalog = None
 
         package_names = self.data_source.get_package_names()
 
         for name in tqdm(package_names, desc="Loading packages"):
             package = Package(name=name, data_source=self.data_source)
             self.packages[name] = package
+            self.package_datasets[name] = []
 
             dataset_ids = package.get_dataset_ids()
             for dataset_id in dataset_ids:
@@ -34,6 +46,7 @@ class DataRepository:
 
                 if dataset.get_path().exists():
                     self.datasets[dataset_id] = dataset
+                    self.package_datasets[name].append(dataset_id)
 
                     columns = dataset.get_columns()
                     for column in columns:
@@ -44,10 +57,51 @@ class DataRepository:
                 if max_datasets is not None and len(self.datasets) >= max_datasets:
                     return
 
+    def load_catalog(self, path: Path, max_datasets=None) -> None:
+        """
+        Use a catalog file written by save_catalog instead of scanning the data
+        source. The repository then queries the catalog's arrays directly,
+        creating packages, datasets and columns only as they are requested.
+        """
+        catalog = Catalog.load(path)
+        if max_datasets is not None:
+            catalog = catalog.head(max_datasets)
+        self.catalog = catalog
+
+    def save_catalog(self, path: Path) -> None:
+        """
+        Save the loaded metadata to a single catalog file.
+        """
+        if self.catalog is not None:
+            self.catalog.save(path)
+            return
+
+        catalog = Catalog.from_metadata(
+            self.package_datasets,
+            {dataset_id: list(columns) for dataset_id, columns in self.columns.items()},
+        )
+        catalog.save(path)
+
+    def _catalog_package(self, package: int) -> Package:
+        return Package(
+            name=self.catalog.package_names[package], data_source=self.data_source
+        )
+
+    def _catalog_dataset(self, dataset: int) -> Dataset:
+        return Dataset(
+            id=self.catalog.dataset_ids[dataset],
+            package=self._catalog_package(self.catalog.dataset_packages[dataset]),
+        )
+
     def list_packages(self) -> Iterator[Package]:
         """
         List all packages in the repository.
         """
+        if self.catalog is not None:
+            for p in range(len(self.catalog.package_names)):
+                yield self._catalog_package(p)
+            return
+
         for package in self.packages.values():
             yield package
 
@@ -55,12 +109,21 @@ class DataRepository:
         """
         Get a package by name.
         """
+        if self.catalog is not None:
+            p = self.catalog.package_index.get(name)
+            return None if p is None else self._catalog_package(p)
+
         return self.packages.get(name)
     
     def list_datasets(self) -> Iterator[Dataset]:
         """
         List all datasets in the repository.
         """
+        if self.catalog is not None:
+            for d in range(len(self.catalog.dataset_ids)):
+                yield self._catalog_dataset(d)
+            return
+
         for dataset in self.datasets.values():
             yield dataset
 
@@ -68,20 +131,36 @@ class DataRepository:
         """
         List all datasets in a package.
         """
-        package = self.get_package(package_name)
-        if package:
-            for dataset_id in package.get_dataset_ids():
-                if dataset_id in self.datasets:
-                    yield self.datasets[dataset_id]
+        if self.catalog is not None:
+            p = self.catalog.package_index.get(package_name)
+            if p is None:
+                return
+            package = self._catalog_package(p)
+            for d in self.catalog.package_datasets(p):
+                yield Dataset(id=self.catalog.dataset_ids[d], package=package)
+            return
+
+        for dataset_id in self.package_datasets.get(package_name, []):
+            yield self.datasets[dataset_id]
 
     def get_dataset(self, dataset_id: str) -> Dataset:
         """
         Get a dataset by its ID.
         """
+        if self.catalog is not None:
+            d = self.catalog.dataset_index.get(dataset_id)
+            return None if d is None else self._catalog_dataset(d)
+
         return self.datasets.get(dataset_id)
 
     def get_column(self, dataset_id: str, column_name: str) -> Column:
         """
         Get a column by dataset ID and column name.
         """
+        if self.catalog is not None:
+            d = self.catalog.dataset_index.get(dataset_id)
+            if d is None or column_name not in self.catalog.dataset_columns(d):
+                return None
+            return Column(name=column_name, dataset=self._catalog_dataset(d))
+
         return self.columns.get(dataset_id, {}).get(column_name)
@@ -1,8 +1,10 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator
+from typing import TYPE_CHECKING, Iterator
 import json
-import pandas as pd
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 @dataclass
@@ -79,7 +81,9 @@ class Dataset(DataFile):
             self.data_source.data_dir / self.data_source.resource_dir / f"{self.id}.csv"
         )
 
-    def load(self, nrows=None) -> pd.DataFrame:
+    def load(self, nrows=None) -> "pd.DataFrame":
+        import pandas as pd
+
         path = self.get_path()
         if not path.exists():
             raise FileNotFoundError(f"Dataset file {path} does not exist.")
@@ -99,7 +103,7 @@ class Column(DataElement):
     name: str
     type: str = None
 
-    def get(self, dataframe: pd.DataFrame) -> pd.Series:
+    def get(self, dataframe: "pd.DataFrame") -> "pd.Series":
         if self.name not in dataframe.columns:
             raise KeyError(f"Column {self.name} does not exist in the dataset.")
         return dataframe[self.name]
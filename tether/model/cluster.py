@@ -1,16 +1,14 @@
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 import numpy as np
-import torch
-from sklearn.cluster import HDBSCAN
 from tqdm import tqdm
 from tether.dataset.source import Column
-from tether.model.item import ItemAutoencoder, process_ascii
 
-
-@dataclass
-class Domain:
-    columns: list[Column]
-    name: str = None
+# torch and scikit-learn are imported by the functions that use them, so that
+# loading precomputed Gaussians or domains does not pay for them.
+if TYPE_CHECKING:
+    from tether.model.item import EmbeddingCache, ItemAutoencoder
 
 
 @dataclass
@@ -19,6 +17,13 @@ class ColumnGaussian:
     covariance: np.ndarray
 
 
+@dataclass
+class Domain:
+    columns: list[Column]
+    name: str = None
+    gaussians: list[ColumnGaussian] = field(default_factory=list)
+
+
 def gaussian_distance(mu1, sigma1, mu2, sigma2):
     sigma = (sigma1 + sigma2) / 2
     diff = mu1 - mu2
@@ -35,44 +40,171 @@ def gaussian_distance(mu1, sigma1, mu2, sigma2):
     return term1 + term2
 
 
-def encode_column(
-    model: ItemAutoencoder, items: list[str], max_items: int = 1000
-) -> ColumnGaussian:
-    if not items:
-        return None
+def gaussian_distances(mu, sigma, means, covariances):
+    """
+    gaussian_distance between one Gaussian and each row of means/covariances.
+    """
+    sigmas = (sigma + covariances) / 2
+    term1 = 0.125 * np.sum((means - mu) ** 2 / sigmas, axis=-1)
+
+    log_prod_sigmas = np.sum(np.log(sigmas), axis=-1)
+    log_prod_sigma1 = np.sum(np.log(sigma))
+    log_prod_sigma2 = np.sum(np.log(covariances), axis=-1)
+
+    term2 = 0.5 * (log_prod_sigmas - 0.5 * (log_prod_sigma1 + log_prod_sigma2))
+
+    return term1 + term2
 
-    if len(items) > max_items:
-        items = items[:max_items]
 
-    ascii_items = process_ascii(items)
-    ascii_items = torch.tensor(ascii_items, dtype=torch.float32)
+def centroid_gaussian(gaussians: list[ColumnGaussian]) -> ColumnGaussian:
+    """
+    Moment-matched Gaussian of an equally weighted mixture of Gaussians.
+    """
+    means = np.stack([gaussian.mean for gaussian in gaussians])
+    covariances = np.stack([gaussian.covariance for gaussian in gaussians])
 
-    encoded = model.encoder(ascii_items)
-    mean = encoded.mean(dim=0).detach().cpu().numpy()
-    variances = encoded.var(dim=0).detach().cpu().numpy()
+    mean = means.mean(axis=0)
+    covariance = (covariances + means**2).mean(axis=0) - mean**2
+    covariance = np.maximum(covariance, 1e-4)
+
+    return ColumnGaussian(mean=mean, covariance=covariance)
+
+
+def column_gaussian(embeddings: np.ndarray, counts: np.ndarray) -> ColumnGaussian:
+    """
+    Frequency-weighted mean and (unbiased) variance of a column whose distinct
+    values have the given embeddings and occurrence counts. Equivalent to the
+    statistics of the embeddings of every occurrence.
+    """
+    counts = counts.astype(np.float64)
+    total = counts.sum()
+
+    mean = counts @ embeddings / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variances = counts @ (embeddings - mean) ** 2 / (total - 1)
     variances = np.nan_to_num(variances, nan=1e-4)
     variances = np.maximum(variances, 1e-4)
 
-    return ColumnGaussian(mean=mean, covariance=variances)
+    return ColumnGaussian(
+        mean=mean.astype(np.float32), covariance=variances.astype(np.float32)
+    )
+
+
+def encode_columns(
+    model: "ItemAutoencoder",
+    items: list[list[str]],
+    max_items: int = 1000,
+    packed: bool = False,
+    cache: "EmbeddingCache" = None,
+    chunk_size: int = 1000,
+    progress: bool = True,
+) -> list[ColumnGaussian]:
+    """
+    Encode columns, encoding each distinct value only once.
+
+    Columns are processed in chunks: the distinct values of a chunk that are
+    not already in the cache are encoded together, and each column's Gaussian
+    is computed from the embeddings of its distinct values weighted by their
+    counts. Returns None for empty columns.
+    """
+    from tether.model.item import EmbeddingCache, encode_items
+
+    if cache is None:
+        cache = EmbeddingCache()
+
+    gaussians = [None] * len(items)
+    progress_bar = tqdm(
+        total=len(items), desc="Encoding columns", disable=not progress
+    )
+    for start in range(0, len(items), chunk_size):
+        column_counts = [
+            Counter(column_items[:max_items])
+            for column_items in items[start : start + chunk_size]
+        ]
+
+        embeddings = {}
+        missing = []
+        for item in dict.fromkeys(v for counts in column_counts for v in counts):
+            embedding = cache.get(item)
+            if embedding is None:
+                missing.append(item)
+            else:
+                embeddings[item] = embedding
+
+        encoded = encode_items(model, missing, packed=packed)
+        for item, embedding in zip(missing, encoded):
+            embeddings[item] = embedding
+            # Copy so that a cached row does not keep the whole chunk alive.
+            cache.put(item, embedding.copy())
+
+        for offset, counts in enumerate(column_counts):
+            if not counts:
+                continue
+            gaussians[start + offset] = column_gaussian(
+                np.stack([embeddings[item] for item in counts]),
+                np.fromiter(counts.values(), dtype=np.int64, count=len(counts)),
+            )
+
+        progress_bar.update(len(column_counts))
+        progress_bar.set_postfix(encoded=cache.misses, cached=cache.hits)
+    progress_bar.close()
+
+    return gaussians
+
+
+def encode_column(
+    model: "ItemAutoencoder",
+    items: list[str],
+    max_items: int = 1000,
+    packed: bool = False,
+    cache: "EmbeddingCache" = None,
+) -> ColumnGaussian:
+    if not items:
+        return None
+
+    return encode_columns(
+        model,
+        [items],
+        max_items=max_items,
+        packed=packed,
+        cache=cache,
+        progress=False,
+    )[0]
 
 
 def cluster_columns(
-    model: ItemAutoencoder,
+    model: "ItemAutoencoder",
     items: list[list[str]],
     columns: list[Column],
     min_cluster_size: int = 3,
+    packed: bool = False,
+    cache: "EmbeddingCache" = None,
 ) -> list[Domain]:
     if not items or not columns:
         return []
 
-    gaussians = []
-    for i, column in enumerate(tqdm(columns, desc="Encoding columns")):
-        if not items[i]:
-            continue
+    gaussians = encode_columns(model, items, packed=packed, cache=cache)
+    return cluster_gaussians(gaussians, columns, min_cluster_size=min_cluster_size)
+
 
-        gaussian = encode_column(model, items[i])
-        if gaussian is not None:
-            gaussians.append((gaussian, column))
+def cluster_gaussians(
+    gaussians: list[ColumnGaussian],
+    columns: list[Column],
+    min_cluster_size: int = 3,
+) -> list[Domain]:
+    """
+    Cluster columns by the distance between their Gaussians. Columns whose
+    Gaussian is None are skipped.
+    """
+    from sklearn.cluster import HDBSCAN
+
+    gaussians = [
+        (gaussian, column)
+        for gaussian, column in zip(gaussians, columns)
+        if gaussian is not None
+    ]
+    if not gaussians:
+        return []
 
     distances = np.zeros((len(gaussians), len(gaussians)))
     for i in tqdm(range(len(gaussians)), desc="Computing distances"):
@@ -97,8 +229,9 @@ def cluster_columns(
         if label not in domains:
             domains[label] = Domain(columns=[])
 
-        _, column = gaussians[i]
+        gaussian, column = gaussians[i]
         domains[label].columns.append(column)
+        domains[label].gaussians.append(gaussian)
 
     for i, (label, domain) in enumerate(domains.items()):
         col_names = [col.name.upper() for col in domain.columns]
@@ -0,0 +1,222 @@
+from dataclasses import dataclass
+from pathlib import Path
+import heapq
+import numpy as np
+from tether.utils.files import atomic_write
+
+
+@dataclass
+class RelationGraph:
+    """
+    Domain relation graph in compressed sparse row form.
+
+    The neighbours of node i are indices[indptr[i]:indptr[i + 1]] with edge
+    weights weights[indptr[i]:indptr[i + 1]], sorted by descending weight.
+    Nodes are addressed by position; ids maps them to domain ids.
+    """
+
+    ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+
+    def __post_init__(self):
+        self.positions = {int(node_id): i for i, node_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(
+        cls,
+        ids: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+    ) -> "RelationGraph":
+        """
+        Build a graph from directed edges given as node positions.
+        """
+        order = np.lexsort((-weights, sources))
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(sources, minlength=len(ids)))
+        return cls(
+            ids=np.asarray(ids, dtype=np.int64),
+            indptr=indptr,
+            indices=targets[order].astype(np.int32),
+            weights=weights[order].astype(np.float64),
+        )
+
+    @classmethod
+    def from_matrix(
+        cls,
+        matrix: np.ndarray,
+        ids: np.ndarray,
+        min_weight: float = 0.0,
+        chunk_size: int = 1024,
+    ) -> "RelationGraph":
+        """
+        Build a graph from a dense relation matrix such as the PPMI matrix of
+        get_domain_relations, keeping off-diagonal weights above min_weight.
+        """
+        matrix = np.nan_to_num(np.asarray(matrix, dtype=np.float64))
+        sources, targets, weights = [], [], []
+        for start in range(0, len(matrix), chunk_size):
+            chunk = matrix[start : start + chunk_size]
+            rows, cols = np.nonzero(chunk > min_weight)
+            keep = rows + start != cols
+            rows, cols = rows[keep], cols[keep]
+            sources.append(rows + start)
+            targets.append(cols)
+            weights.append(chunk[rows, cols])
+
+        return cls.from_edges(
+            ids,
+            np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64),
+            np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64),
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float64),
+        )
+
+    def save(self, path: Path) -> None:
+        atomic_write(
+            path,
+            lambda f: np.savez(
+                f,
+                ids=self.ids,
+                indptr=self.indptr,
+                indices=self.indices,
+                weights=self.weights,
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "RelationGraph":
+        with np.load(path) as data:
+            return cls(**{key: data[key] for key in data.files})
+
+    def position(self, node_id: int) -> int | None:
+        return self.positions.get(int(node_id))
+
+    def neighbors(self, node: int, min_weight: float = 0.0):
+        start, end = self.indptr[node], self.indptr[node + 1]
+        indices = self.indices[start:end]
+        weights = self.weights[start:end]
+        # Neighbours are sorted by descending weight, so cut at the first
+        # weight below the threshold.
+        end = len(weights) - np.searchsorted(weights[::-1], min_weight, side="left")
+        return indices[:end], weights[:end]
+
+    def bfs(
+        self,
+        source: int,
+        max_hops: int = 2,
+        min_weight: float = 0.0,
+        max_nodes: int = 1000,
+    ) -> tuple[dict[int, int], bool]:
+        """
+        Nodes within max_hops of source over edges of at least min_weight.
+        Returns the hop count of each node reached (source included) and
+        whether the search stopped at max_nodes.
+        """
+        hops = {source: 0}
+        frontier = [source]
+        for hop in range(1, max_hops + 1):
+            next_frontier = []
+            for node in frontier:
+                indices, _ = self.neighbors(node, min_weight)
+                for neighbor in indices.tolist():
+                    if neighbor in hops:
+                        continue
+                    if len(hops) >= max_nodes:
+                        return hops, True
+                    hops[neighbor] = hop
+                    next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        return hops, False
+
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        min_weight: float = 0.0,
+        max_expanded: int = 10_000,
+    ) -> tuple[list[int], float] | None:
+        """
+        Dijkstra's shortest path where an edge costs 1 / weight, so strongly
+        related domains are close. Returns the path and its cost, or None if
+        target is unreachable within max_expanded expanded nodes.
+        """
+        distances = {source: 0.0}
+        previous = {}
+        visited = set()
+        heap = [(0.0, source)]
+
+        while heap and len(visited) < max_expanded:
+            distance, node = heapq.heappop(heap)
+            if node in visited:
+                continue
+            visited.add(node)
+
+            if node == target:
+                path = [node]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return path[::-1], distance
+
+            indices, weights = self.neighbors(node, min_weight)
+            for neighbor, weight in zip(indices.tolist(), weights.tolist()):
+                if neighbor in visited or weight <= 0:
+                    continue
+                candidate = distance + 1.0 / weight
+                if candidate < distances.get(neighbor, np.inf):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (candidate, neighbor))
+
+        return None
+
+    def ego_subgraph(
+        self,
+        source: int,
+        radius: int = 1,
+        min_weight: float = 0.0,
+        max_nodes: int = 200,
+        max_edges: int = 2000,
+    ) -> tuple[list[int], list[tuple[int, int, float]], bool]:
+        """
+        The subgraph induced by the nodes within radius of source. Each
+        undirected edge is returned once, strongest first. Returns the nodes,
+        edges and whether either limit truncated the result.
+        """
+        hops, truncated = self.bfs(
+            source, max_hops=radius, min_weight=min_weight, max_nodes=max_nodes
+        )
+        nodes = list(hops)
+
+        adjacency = [self.neighbors(node, min_weight) for node in nodes]
+        sources = np.repeat(nodes, [len(indices) for indices, _ in adjacency])
+        targets = np.concatenate([indices for indices, _ in adjacency])
+        weights = np.concatenate([weights for _, weights in adjacency])
+        keep = (sources < targets) & np.isin(targets, nodes)
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+        order = np.argsort(-weights, kind="stable")
+        if len(order) > max_edges:
+            order = order[:max_edges]
+            truncated = True
+
+        edges = list(
+            zip(
+                sources[order].tolist(),
+                targets[order].tolist(),
+                weights[order].tolist(),
+            )
+        )
+        return nodes, edges, truncated
@@ -0,0 +1,331 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+import shutil
+import numpy as np
+from tether.model.cluster import (
+    ColumnGaussian,
+    Domain,
+    centroid_gaussian,
+    encode_column,
+    gaussian_distances,
+)
+from tether.utils.files import atomic_write
+
+if TYPE_CHECKING:
+    from tether.model.item import ItemAutoencoder
+
+
+@dataclass
+class DomainIndex:
+    """
+    Centroid Gaussians of the domains found by cluster_columns, keyed by their
+    database ids. `packed` records how the column items were encoded, so
+    queries are encoded the same way.
+    """
+
+    ids: np.ndarray
+    names: np.ndarray
+    means: np.ndarray
+    covariances: np.ndarray
+    packed: bool = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_domains(
+        cls, domains: list[Domain], ids: list[int], packed: bool = False
+    ) -> "DomainIndex":
+        """
+        Build the index of a clustering, which may have found no domains, e.g.
+        on small repositories. Queries on an empty index return no matches.
+        """
+        if not domains:
+            return cls(
+                ids=np.zeros(0, dtype=np.int64),
+                names=np.zeros(0, dtype=str),
+                means=np.zeros((0, 0), dtype=np.float32),
+                covariances=np.zeros((0, 0), dtype=np.float32),
+                packed=packed,
+            )
+
+        centroids = [centroid_gaussian(domain.gaussians) for domain in domains]
+        return cls(
+            ids=np.asarray(ids, dtype=np.int64),
+            names=np.array([domain.name or "" for domain in domains], dtype=str),
+            means=np.stack([c.mean for c in centroids]).astype(np.float32),
+            covariances=np.stack([c.covariance for c in centroids]).astype(
+                np.float32
+            ),
+            packed=packed,
+        )
+
+    def save(self, path: Path) -> None:
+        atomic_write(
+            path,
+            lambda f: np.savez(
+                f,
+                ids=self.ids,
+                names=self.names,
+                means=self.means,
+                covariances=self.covariances,
+                packed=np.array(self.packed),
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "DomainIndex":
+        with np.load(path) as data:
+            return cls(
+                ids=data["ids"],
+                names=data["names"],
+                means=data["means"],
+                covariances=data["covariances"],
+                packed=bool(data["packed"]),
+            )
+
+    def query(self, gaussian: ColumnGaussian, k: int = 5) -> list[tuple[int, float]]:
+        """
+        Find the k domains closest to a column Gaussian.
+        Returns (domain id, distance) pairs, nearest first.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}.")
+        if len(self) == 0:
+            return []
+
+        distances = gaussian_distances(
+            gaussian.mean, gaussian.covariance, self.means, self.covariances
+        )
+
+        k = min(k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [(int(self.ids[i]), float(distances[i])) for i in nearest]
+
+
+def lookup_domains(
+    model: "ItemAutoencoder",
+    index: DomainIndex,
+    items: list[str],
+    k: int = 5,
+    max_items: int = 1000,
+) -> list[tuple[int, float]]:
+    """
+    Encode a sample of column values and find its k nearest domains.
+    """
+    items = [str(item) for item in items if item is not None and item != ""]
+    gaussian = encode_column(model, items, max_items=max_items, packed=index.packed)
+    if gaussian is None or len(index) == 0:
+        return []
+    return index.query(gaussian, k=k)
+
+
+def kmeans(
+    points: np.ndarray,
+    num_clusters: int,
+    iterations: int = 10,
+    max_samples: int = 256,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Lloyd's k-means on at most max_samples points per cluster.
+    Returns the cluster centroids.
+    """
+    rng = np.random.default_rng(seed)
+    if len(points) > num_clusters * max_samples:
+        sample = rng.choice(len(points), num_clusters * max_samples, replace=False)
+        points = points[sample]
+    points = points.astype(np.float32)
+
+    centroids = points[rng.choice(len(points), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(points, centroids)[:, 0]
+        counts = np.bincount(assignments, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = points[rng.choice(len(points), empty.sum(), replace=False)]
+
+    return centroids
+
+
+def nearest_centroids(points: np.ndarray, centroids: np.ndarray, n: int = 1):
+    """
+    Indices of the n centroids closest (in squared L2) to each point, as an
+    array of shape (len(points), n).
+    """
+    distances = np.sum(centroids**2, axis=1)[None, :] - 2 * points @ centroids.T
+    n = max(1, min(n, centroids.shape[0]))
+    if n == 1:
+        return np.argmin(distances, axis=1)[:, None]
+    return np.argpartition(distances, n - 1, axis=1)[:, :n]
+
+
+@dataclass
+class ColumnIndex:
+    """
+    Inverted-file index over the Gaussians of every encoded column.
+
+    Columns are assigned to the nearest of a set of k-means centroids of
+    their means and stored grouped by list, so list l is the contiguous rows
+    list_offsets[l]:list_offsets[l + 1]. A query scans the nprobe lists
+    nearest to its mean, shortlists candidates by the L2 distance between
+    means, and reranks the shortlist by the exact gaussian_distance. With a
+    single list this is a flat index.
+    """
+
+    ids: np.ndarray
+    means: np.ndarray
+    covariances: np.ndarray
+    centroids: np.ndarray
+    list_offsets: np.ndarray
+
+    def __post_init__(self):
+        self.id_order = np.argsort(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        gaussians: list[ColumnGaussian],
+        ids: list[int],
+        num_lists: int = None,
+        seed: int = 0,
+    ) -> "ColumnIndex":
+        if not gaussians:
+            return cls(
+                ids=np.zeros(0, dtype=np.int64),
+                means=np.zeros((0, 0), dtype=np.float32),
+                covariances=np.zeros((0, 0), dtype=np.float32),
+                centroids=np.zeros((0, 0), dtype=np.float32),
+                list_offsets=np.zeros(1, dtype=np.int64),
+            )
+
+        means = np.stack([g.mean for g in gaussians]).astype(np.float32)
+        covariances = np.stack([g.covariance for g in gaussians]).astype(np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if num_lists is None:
+            num_lists = max(1, int(np.sqrt(len(means))))
+        num_lists = min(num_lists, len(means))
+
+        if num_lists > 1:
+            centroids = kmeans(means, num_lists, seed=seed)
+            assignments = nearest_centroids(means, centroids)[:, 0]
+        else:
+            centroids = means.mean(axis=0, keepdims=True)
+            assignments = np.zeros(len(means), dtype=np.int64)
+
+        order = np.argsort(assignments, kind="stable")
+        list_offsets = np.zeros(num_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=num_lists))
+
+        return cls(
+            ids=ids[order],
+            means=means[order],
+            covariances=covariances[order],
+            centroids=centroids,
+            list_offsets=list_offsets,
+        )
+
+    def save(self, path: Path) -> None:
+        """
+        Save the index as a directory of .npy files. The files are written to
+        a temporary directory that then takes the place of path, so a reader
+        memory-mapping the previous index never sees its files rewritten.
+        """
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        old_path = path.with_name(f"{path.name}.old")
+        for stale_path in (tmp_path, old_path):
+            if stale_path.exists():
+                shutil.rmtree(stale_path)
+
+        tmp_path.mkdir(parents=True)
+        for name in ("ids", "means", "covariances", "centroids", "list_offsets"):
+            np.save(tmp_path / f"{name}.npy", getattr(self, name))
+
+        if path.exists():
+            # Files that are still mapped stay valid after they are removed.
+            path.rename(old_path)
+            tmp_path.rename(path)
+            shutil.rmtree(old_path)
+        else:
+            tmp_path.rename(path)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ColumnIndex":
+        """
+        Load an index saved with save. With mmap, the column means and
+        covariances are memory-mapped rather than read into memory.
+        """
+        path = Path(path)
+        mmap_mode = "r" if mmap else None
+        return cls(
+            ids=np.load(path / "ids.npy"),
+            means=np.load(path / "means.npy", mmap_mode=mmap_mode),
+            covariances=np.load(path / "covariances.npy", mmap_mode=mmap_mode),
+            centroids=np.load(path / "centroids.npy"),
+            list_offsets=np.load(path / "list_offsets.npy"),
+        )
+
+    def get(self, column_id: int) -> ColumnGaussian | None:
+        position = np.searchsorted(self.ids, column_id, sorter=self.id_order)
+        if position == len(self.ids) or self.ids[self.id_order[position]] != column_id:
+            return None
+        row = self.id_order[position]
+        return ColumnGaussian(
+            mean=np.asarray(self.means[row]),
+            covariance=np.asarray(self.covariances[row]),
+        )
+
+    def query(
+        self,
+        gaussian: ColumnGaussian,
+        k: int = 10,
+        nprobe: int = 8,
+        shortlist: int = None,
+        exclude: int = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Find approximately the k columns closest to a Gaussian.
+        Returns (column id, distance) pairs, nearest first.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}.")
+        if len(self) == 0:
+            return []
+
+        mu = gaussian.mean.astype(np.float32)
+        lists = nearest_centroids(mu[None, :], self.centroids, n=nprobe)[0]
+        lists = np.sort(lists)  # scan the memory map in order
+        rows = np.concatenate(
+            [
+                np.arange(self.list_offsets[i], self.list_offsets[i + 1])
+                for i in lists
+            ]
+        )
+        if exclude is not None:
+            rows = rows[self.ids[rows] != exclude]
+        if len(rows) == 0:
+            return []
+
+        shortlist = max(shortlist or 10 * k, k)
+        if len(rows) > shortlist:
+            means = self.means[rows]
+            coarse = np.sum((means - mu) ** 2, axis=1)
+            rows = np.sort(rows[np.argpartition(coarse, shortlist - 1)[:shortlist]])
+
+        distances = gaussian_distances(
+            gaussian.mean, gaussian.covariance, self.means[rows], self.covariances[rows]
+        )
+        k = min(k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [(int(self.ids[rows[i]]), float(distances[i])) for i in nearest]
@@ -1,7 +1,9 @@
+from collections import OrderedDict
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pack_padded_sequence
 
 
 class ItemAutoencoder(torch.nn.Module):
@@ -29,11 +31,20 @@ class ItemAutoencoder(torch.nn.Module):
         )
         self.output_linear = nn.Linear(64, input_dim)
 
-    def encoder(self, x):
+    def encoder(self, x, lengths=None):
         x = F.relu(self.input_linear(x))
-        x, _ = self.encoder_lstm(x)
-        x = x[:, -1, :]
-        return x
+        if lengths is None:
+            x, _ = self.encoder_lstm(x)
+            x = x[:, -1, :]
+            return x
+
+        # Only run the LSTM over the real characters of each item and take the
+        # last real hidden state instead of the state after the padding.
+        x = pack_padded_sequence(
+            x, lengths.cpu(), batch_first=True, enforce_sorted=False
+        )
+        _, (h, _) = self.encoder_lstm(x)
+        return h[-1]
 
     def decoder(self, x):
         x = x.unsqueeze(1).repeat(1, self.input_size, 1)
@@ -48,8 +59,8 @@ class ItemAutoencoder(torch.nn.Module):
         return decoded
 
 
-def load_model(model: torch.nn.Module, filepath: str):
-    model.load_state_dict(torch.load(filepath))
+def load_model(model: torch.nn.Module, filepath: str, device="cpu"):
+    model.load_state_dict(torch.load(filepath, map_location=device))
     model.eval()
     return model
 
@@ -70,3 +81,90 @@ def process_ascii(ascii_items: list[str], max_length=100):
         one_hot_ascii = np.concatenate((one_hot_ascii, padding), axis=1)
 
     return one_hot_ascii
+
+
+def item_lengths(ascii_items: list[str], max_length=100) -> np.ndarray:
+    """
+    Number of timesteps each item occupies once truncated to max_length.
+    Empty items are given a single (all-zero) timestep.
+    """
+    return np.array(
+        [min(max(len(item), 1), max_length) for item in ascii_items], dtype=np.int64
+    )
+
+
+def encode_items(
+    model: ItemAutoencoder,
+    ascii_items: list[str],
+    max_length=100,
+    batch_size=512,
+    packed=False,
+) -> np.ndarray:
+    """
+    Encode items in batches of similar length.
+
+    With packed=False, every item is padded to max_length and encoded exactly
+    like ItemAutoencoder.encoder on process_ascii output, which is what the
+    released checkpoint was trained on. With packed=True, items are sorted by
+    length and each batch is only padded to its longest item, with the LSTM
+    run on packed sequences; use it with checkpoints trained on packed
+    sequences by tether.model.train.
+    """
+    encoded = np.zeros((len(ascii_items), model.hidden_dim), dtype=np.float32)
+    if not ascii_items:
+        return encoded
+
+    device = next(model.parameters()).device
+    lengths = item_lengths(ascii_items, max_length=max_length)
+    order = np.argsort(-lengths, kind="stable")
+
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            batch_items = [ascii_items[i] for i in batch]
+
+            if packed:
+                batch_lengths = lengths[batch]
+                x = process_ascii(batch_items, max_length=int(batch_lengths.max()))
+                x = torch.from_numpy(x).to(device)
+                output = model.encoder(x, lengths=torch.from_numpy(batch_lengths))
+            else:
+                x = process_ascii(batch_items, max_length=max_length)
+                x = torch.from_numpy(x).to(device)
+                output = model.encoder(x)
+
+            encoded[batch] = output.cpu().numpy()
+
+    return encoded
+
+
+class EmbeddingCache:
+    """
+    LRU cache mapping item strings to their embeddings. A cache should only be
+    shared between calls that use the same model and encoding settings.
+    """
+
+    def __init__(self, maxsize=1_000_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._embeddings = OrderedDict()
+
+    def __len__(self):
+        return len(self._embeddings)
+
+    def get(self, item: str) -> np.ndarray | None:
+        embedding = self._embeddings.get(item)
+        if embedding is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._embeddings.move_to_end(item)
+        return embedding
+
+    def put(self, item: str, embedding: np.ndarray) -> None:
+        self._embeddings[item] = embedding
+        self._embeddings.move_to_end(item)
+        if len(self._embeddings) > self.maxsize:
+            self._embeddings.popitem(last=False)
@@ -1,9 +1,12 @@
+from typing import TYPE_CHECKING
 import numpy as np
-import pandas as pd
 from tqdm import tqdm
 from tether.dataset.source import Column
 from tether.model.cluster import Domain
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def ppmi(
     matrix: np.ndarray,
@@ -34,10 +37,13 @@ def ppmi(
 
 def get_domain_relations(domains: list[Domain], dataset_ids: list[str]) -> np.ndarray:
     dataset_domain_matrix = np.zeros((len(dataset_ids), len(domains)), dtype=int)
+    dataset_indices = {
+        dataset_id: i for i, dataset_id in reversed(list(enumerate(dataset_ids)))
+    }
 
     for domain_index, domain in enumerate(tqdm(domains, desc="Processing domains")):
         for column in domain.columns:
-            dataset_index = dataset_ids.index(column.dataset.id)
+            dataset_index = dataset_indices[column.dataset.id]
             dataset_domain_matrix[dataset_index, domain_index] += 1
 
     correlations = ppmi(dataset_domain_matrix, smoothing=1e-8)
@@ -52,7 +58,9 @@ def get_column_relations(
     domain_relations: np.ndarray,
     columns: list[Column],
     max_relations: int = 10,
-) -> pd.DataFrame:
+) -> "pd.DataFrame":
+    import pandas as pd
+
     column_names = [get_column_id(col) for col in columns]
     column_relations = pd.DataFrame(
         index=column_names,
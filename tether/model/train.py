@@ -0,0 +1,503 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset as TorchDataset
+from tqdm import tqdm
+from tether.dataset.repository import DataRepository
+from tether.dataset.source import DataSource
+from tether.model.item import ItemAutoencoder
+from tether.utils.files import atomic_write
+
+
+def encode_codes(item: str, max_length=100) -> np.ndarray:
+    """
+    Character codes of an item as used by process_ascii: ord(char) + 1 for
+    characters below 255 and 0 for anything else.
+    """
+    codes = np.fromiter(map(ord, item[:max_length]), dtype=np.int64)
+    return np.where(codes < 255, codes + 1, 0).astype(np.uint8)
+
+
+def one_hot_codes(codes: np.ndarray, max_length=100) -> np.ndarray:
+    """
+    One-hot encode character codes, matching a single row of process_ascii.
+    """
+    one_hot = np.zeros((max_length, 256), dtype=np.float32)
+    one_hot[np.arange(len(codes)), codes] = 1.0
+    return one_hot
+
+
+class ItemCorpus:
+    """
+    Items stored as one flat array of character codes, grouped by column.
+
+    Item i spans codes[item_offsets[i]:item_offsets[i + 1]] and belongs to
+    column item_columns[i]; the items of column c are the contiguous range
+    column_offsets[c]:column_offsets[c + 1].
+    """
+
+    def __init__(self, codes, item_offsets, column_offsets, column_names, packages):
+        self.codes = codes
+        self.item_offsets = item_offsets
+        self.column_offsets = column_offsets
+        self.column_names = column_names
+        self.packages = packages
+
+        column_sizes = np.diff(column_offsets)
+        self.item_columns = np.repeat(
+            np.arange(len(column_sizes), dtype=np.int32), column_sizes
+        )
+
+    def __len__(self):
+        return len(self.item_offsets) - 1
+
+    @property
+    def num_columns(self):
+        return len(self.column_offsets) - 1
+
+    def get_codes(self, idx: int) -> np.ndarray:
+        return self.codes[self.item_offsets[idx] : self.item_offsets[idx + 1]]
+
+    @classmethod
+    def from_repository(
+        cls,
+        repository: DataRepository,
+        max_rows: int = 200,
+        max_length: int = 100,
+    ) -> "ItemCorpus":
+        codes = []
+        item_offsets = [0]
+        column_offsets = [0]
+        column_names = []
+        packages = []
+
+        for dataset in tqdm(list(repository.list_datasets()), desc="Loading datasets"):
+            df = dataset.load(nrows=max_rows)
+            for col in df.select_dtypes(include=["object"]).columns:
+                values = [str(value) for value in df[col].dropna().tolist()]
+                if not values:
+                    continue
+
+                for value in values:
+                    item_codes = encode_codes(value, max_length=max_length)
+                    codes.append(item_codes)
+                    item_offsets.append(item_offsets[-1] + len(item_codes))
+                column_offsets.append(len(item_offsets) - 1)
+                column_names.append(f"{dataset.id}.{col}")
+                packages.append(dataset.package.name)
+
+        return cls(
+            codes=np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint8),
+            item_offsets=np.array(item_offsets, dtype=np.int64),
+            column_offsets=np.array(column_offsets, dtype=np.int64),
+            column_names=np.array(column_names, dtype=str),
+            packages=np.array(packages, dtype=str),
+        )
+
+    def select_columns(self, column_indices: np.ndarray) -> "ItemCorpus":
+        """
+        Build a corpus containing only the given columns.
+        """
+        codes = []
+        item_offsets = [np.zeros(1, dtype=np.int64)]
+        column_offsets = [0]
+        for c in column_indices:
+            start, end = self.column_offsets[c], self.column_offsets[c + 1]
+            offsets = self.item_offsets[start : end + 1]
+            codes.append(self.codes[offsets[0] : offsets[-1]])
+            item_offsets.append(offsets[1:] - offsets[0] + item_offsets[-1][-1])
+            column_offsets.append(column_offsets[-1] + end - start)
+
+        return ItemCorpus(
+            codes=np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint8),
+            item_offsets=np.concatenate(item_offsets),
+            column_offsets=np.array(column_offsets, dtype=np.int64),
+            column_names=self.column_names[column_indices],
+            packages=self.packages[column_indices],
+        )
+
+    def split_by_package(self, test_size=0.2, seed=42):
+        """
+        Split the corpus into train and test corpora with disjoint packages.
+        The number of test packages is rounded up, as in train_test_split,
+        but at least one package is kept for training.
+        """
+        package_names = np.unique(self.packages)
+        rng = np.random.default_rng(seed)
+        rng.shuffle(package_names)
+
+        num_test = min(
+            int(np.ceil(len(package_names) * test_size)), len(package_names) - 1
+        )
+        is_test = np.isin(self.packages, package_names[:num_test])
+
+        return (
+            self.select_columns(np.flatnonzero(~is_test)),
+            self.select_columns(np.flatnonzero(is_test)),
+        )
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            codes=self.codes,
+            item_offsets=self.item_offsets,
+            column_offsets=self.column_offsets,
+            column_names=self.column_names,
+            packages=self.packages,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "ItemCorpus":
+        with np.load(path) as data:
+            return cls(**{key: data[key] for key in data.files})
+
+
+class ContrastiveItemDataset(TorchDataset):
+    """
+    Triplets of (anchor, positive, negative) items, where the positive is
+    drawn from the anchor's column and the negative from any other column,
+    followed by the lengths of the three items. Items are one-hot encoded on
+    access so tokenization happens in the DataLoader workers.
+    """
+
+    def __init__(self, corpus: ItemCorpus, max_length=100, seed=None):
+        if corpus.num_columns < 2:
+            raise ValueError("At least two columns are needed to sample negatives.")
+
+        self.corpus = corpus
+        self.max_length = max_length
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def __getitem__(self, idx):
+        corpus = self.corpus
+        column = corpus.item_columns[idx]
+        start, end = corpus.column_offsets[column], corpus.column_offsets[column + 1]
+        positive_idx = self.rng.integers(start, end)
+
+        # Draw from all columns but this one without building a candidate list.
+        negative_column = self.rng.integers(corpus.num_columns - 1)
+        if negative_column >= column:
+            negative_column += 1
+        negative_idx = self.rng.integers(
+            corpus.column_offsets[negative_column],
+            corpus.column_offsets[negative_column + 1],
+        )
+
+        codes = [corpus.get_codes(i) for i in (idx, positive_idx, negative_idx)]
+        # Empty items still take one (all-zero) timestep, as in item_lengths.
+        lengths = torch.tensor([max(len(c), 1) for c in codes], dtype=torch.int64)
+        return (
+            *(
+                torch.from_numpy(one_hot_codes(c, max_length=self.max_length))
+                for c in codes
+            ),
+            lengths,
+        )
+
+
+def seed_worker(worker_id):
+    info = torch.utils.data.get_worker_info()
+    dataset = info.dataset
+    dataset.rng = np.random.default_rng(
+        None if dataset.seed is None else (dataset.seed, info.seed)
+    )
+
+
+def triplet_loss(anchor, positive, negative, margin=0.2, distance="cosine"):
+    if distance == "cosine":
+        d_ap = 1 - F.cosine_similarity(anchor, positive)
+        d_an = 1 - F.cosine_similarity(anchor, negative)
+    elif distance == "euclidean":
+        d_ap = F.pairwise_distance(anchor, positive)
+        d_an = F.pairwise_distance(anchor, negative)
+    else:
+        raise ValueError("Unsupported distance metric")
+
+    loss = F.relu(d_ap - d_an + margin)
+    return loss.mean()
+
+
+def reconstruction_loss(original, reconstructed):
+    logits_flat = reconstructed.view(-1, reconstructed.size(-1))
+    targets_flat = original.argmax(dim=-1).view(-1)
+
+    loss = F.cross_entropy(logits_flat, targets_flat, reduction="mean")
+    return loss
+
+
+def save_checkpoint(path: Path, model, optimizer, epoch: int, step: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint = {
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "epoch": epoch,
+        "step": step,
+    }
+    atomic_write(path, lambda f: torch.save(checkpoint, f))
+
+
+def load_checkpoint(path: Path, model, optimizer, device="cpu") -> tuple[int, int]:
+    checkpoint = torch.load(path, map_location=device)
+    model.load_state_dict(checkpoint["model"])
+    optimizer.load_state_dict(checkpoint["optimizer"])
+    return checkpoint["epoch"], checkpoint["step"]
+
+
+def train_epoch(
+    model,
+    train_loader,
+    optimizer,
+    device,
+    epoch: int = 0,
+    step: int = 0,
+    checkpoint_path: Path = None,
+    checkpoint_every: int = None,
+    packed: bool = True,
+):
+    """
+    Train for one epoch. With packed=True the encoder runs on packed
+    sequences, matching encode_items(..., packed=True) at inference.
+    """
+    model.train()
+    total_rec_loss = 0.0
+    total_triplet_loss = 0.0
+
+    for batch in tqdm(train_loader, desc=f"Training epoch {epoch + 1}"):
+        *items, lengths = batch
+        anchor, positive, negative = (x.to(device, non_blocking=True) for x in items)
+        lengths = lengths.unbind(1) if packed else [None] * 3
+
+        optimizer.zero_grad()
+
+        anchor_encoded = model.encoder(anchor, lengths[0])
+        positive_encoded = model.encoder(positive, lengths[1])
+        negative_encoded = model.encoder(negative, lengths[2])
+
+        output = model.decoder(anchor_encoded)
+
+        rec_loss_value = reconstruction_loss(anchor, output)
+        triplet_loss_value = triplet_loss(
+            anchor_encoded, positive_encoded, negative_encoded
+        )
+
+        total_rec_loss += rec_loss_value.item()
+        total_triplet_loss += triplet_loss_value.item()
+        loss = 0.5 * rec_loss_value + 0.5 * triplet_loss_value
+        loss.backward()
+        optimizer.step()
+
+        step += 1
+        if checkpoint_path and checkpoint_every and step % checkpoint_every == 0:
+            save_checkpoint(checkpoint_path, model, optimizer, epoch, step)
+
+    rec_loss_avg = total_rec_loss / len(train_loader)
+    triplet_loss_avg = total_triplet_loss / len(train_loader)
+
+    return rec_loss_avg, triplet_loss_avg, step
+
+
+def evaluate_model(model, test_loader, device, packed: bool = True):
+    model.eval()
+    total_rec_loss = 0.0
+    total_triplet_loss = 0.0
+    with torch.no_grad():
+        for batch in tqdm(test_loader, desc="Evaluating"):
+            *items, lengths = batch
+            anchor, positive, negative = (x.to(device) for x in items)
+            lengths = lengths.unbind(1) if packed else [None] * 3
+
+            anchor_encoded = model.encoder(anchor, lengths[0])
+            output = model.decoder(anchor_encoded)
+            rec_loss_value = reconstruction_loss(anchor, output)
+            triplet_loss_value = triplet_loss(
+                anchor_encoded,
+                model.encoder(positive, lengths[1]),
+                model.encoder(negative, lengths[2]),
+            )
+            total_rec_loss += rec_loss_value.item()
+            total_triplet_loss += triplet_loss_value.item()
+    rec_loss_avg = total_rec_loss / len(test_loader)
+    triplet_loss_avg = total_triplet_loss / len(test_loader)
+    return rec_loss_avg, triplet_loss_avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the item autoencoder")
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        default="data",
+        help="Directory containing the dataset files",
+    )
+    parser.add_argument(
+        "--package-dir",
+        type=str,
+        default="packages",
+        help="Directory containing the package metadata",
+    )
+    parser.add_argument(
+        "--resource-dir",
+        type=str,
+        default="resources",
+        help="Directory containing additional resources",
+    )
+    parser.add_argument(
+        "--max-datasets",
+        type=int,
+        default=None,
+        help="Maximum number of datasets to load",
+    )
+    parser.add_argument(
+        "--max-rows",
+        type=int,
+        default=200,
+        help="Number of rows to sample items from in each dataset",
+    )
+    parser.add_argument(
+        "--corpus-path",
+        type=str,
+        default=None,
+        help="Item corpus file; built from the data directory and saved here "
+        "if it does not exist, loaded from here otherwise",
+    )
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=4,
+        help="Number of DataLoader workers tokenizing items",
+    )
+    parser.add_argument(
+        "--padded",
+        action="store_true",
+        help="Train the encoder on items padded to full length, like the released "
+        "checkpoint, instead of on packed sequences",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--checkpoint-path",
+        type=str,
+        default="tether/checkpoints/item_autoencoder_training.pth",
+        help="Path of the periodic training checkpoint",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=1000,
+        help="Save a training checkpoint every this many steps",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume training from the training checkpoint",
+    )
+    parser.add_argument(
+        "--model-path",
+        type=str,
+        default="tether/checkpoints/item_autoencoder.pth",
+        help="Path to save the trained model weights",
+    )
+    args = parser.parse_args()
+
+    corpus_path = Path(args.corpus_path) if args.corpus_path else None
+    if corpus_path and corpus_path.exists():
+        corpus = ItemCorpus.load(corpus_path)
+    else:
+        data_source = DataSource(
+            data_dir=Path(args.data_dir),
+            package_dir=args.package_dir,
+            resource_dir=args.resource_dir,
+        )
+        data_repository = DataRepository(data_source=data_source)
+        data_repository.load_all_metadata(max_datasets=args.max_datasets)
+
+        corpus = ItemCorpus.from_repository(data_repository, max_rows=args.max_rows)
+        if corpus_path:
+            corpus.save(corpus_path)
+    print(f"Loaded {len(corpus)} items from {corpus.num_columns} columns.")
+
+    train_corpus, test_corpus = corpus.split_by_package(seed=args.seed)
+
+    torch.manual_seed(args.seed)
+    generator = torch.Generator().manual_seed(args.seed)
+    loader_kwargs = dict(
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        worker_init_fn=seed_worker,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=args.num_workers > 0,
+    )
+    train_loader = DataLoader(
+        ContrastiveItemDataset(train_corpus, seed=args.seed),
+        shuffle=True,
+        generator=generator,
+        **loader_kwargs,
+    )
+    # Negatives are drawn from other columns, so a test split of fewer than
+    # two columns (e.g. a single small test package) cannot be evaluated.
+    test_loader = None
+    if test_corpus.num_columns >= 2:
+        test_loader = DataLoader(
+            ContrastiveItemDataset(test_corpus, seed=args.seed + 1),
+            shuffle=False,
+            **loader_kwargs,
+        )
+    else:
+        print(
+            f"Skipping evaluation: the test split has {test_corpus.num_columns} "
+            "columns."
+        )
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = ItemAutoencoder(input_dim=256, hidden_dim=64, input_size=100)
+    model.to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+
+    checkpoint_path = Path(args.checkpoint_path)
+    start_epoch, step = 0, 0
+    if args.resume and checkpoint_path.exists():
+        start_epoch, step = load_checkpoint(checkpoint_path, model, optimizer, device)
+        print(f"Resumed from {checkpoint_path} at epoch {start_epoch + 1}.")
+
+    model_path = Path(args.model_path)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    for epoch in range(start_epoch, args.epochs):
+        rec_loss, triplet_loss_val, step = train_epoch(
+            model,
+            train_loader,
+            optimizer,
+            device,
+            epoch=epoch,
+            step=step,
+            checkpoint_path=checkpoint_path,
+            checkpoint_every=args.checkpoint_every,
+            packed=not args.padded,
+        )
+        print(
+            f"Epoch {epoch + 1}/{args.epochs}, Rec Loss: {rec_loss:.4f}, Triplet Loss: {triplet_loss_val:.4f}",
+        )
+        if test_loader is not None:
+            rec_loss, triplet_loss_val = evaluate_model(
+                model, test_loader, device, packed=not args.padded
+            )
+            print(
+                f"Test Rec Loss: {rec_loss:.4f}, Test Triplet Loss: {triplet_loss_val:.4f}",
+            )
+
+        save_checkpoint(checkpoint_path, model, optimizer, epoch + 1, step)
+        torch.save(model.state_dict(), model_path)
+
+    print(f"Model saved to {model_path}.")
+
+
+if __name__ == "__main__":
+    main()
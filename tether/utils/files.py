@@ -0,0 +1,21 @@
+from pathlib import Path
+from typing import BinaryIO, Callable
+import os
+
+
+def atomic_write(path: Path, write: Callable[[BinaryIO], None]) -> Path:
+    """
+    Write a file through write(f) into a temporary file of this process next
+    to path, then move it in place. Readers of path, such as the API while
+    the pipeline republishes, see either the old file or the complete new one,
+    and concurrent writers never share a temporary file.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
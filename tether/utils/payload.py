@@ -0,0 +1,171 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator
+import json
+from tether.utils.files import atomic_write
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Parameter sets of /domain-relations whose response is precomputed by the
+# pipeline; the first one matches the endpoint defaults.
+GRAPH_PARAMETERS = [
+    {"nlargest": 10, "min_weight": 0.5, "num_examples": 10},
+    {"nlargest": 5, "min_weight": 0.5, "num_examples": 5},
+    {"nlargest": 20, "min_weight": 0.0, "num_examples": 10},
+]
+
+
+def dumps(obj) -> bytes:
+    """
+    Serialize to JSON bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+async def iter_chunks(
+    payload: bytes, chunk_size: int = 64 * 1024
+) -> AsyncIterator[bytes]:
+    """
+    Chunks of an in-memory payload for StreamingResponse. Asynchronous, so
+    that the response does not hop to the threadpool for every chunk.
+    """
+    view = memoryview(payload)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+def domain_sort_key(name: str | None) -> tuple:
+    """
+    Order of domains in the /domain-relations response: by name, with
+    unnamed domains last. Sorting in Python rather than in the database keeps
+    the order independent of how the dialect sorts NULLs and of its
+    collation.
+    """
+    unnamed = name is None or name != name  # None or NaN
+    return (unnamed, "" if unnamed else name)
+
+
+def domain_graph_path(
+    output_dir: Path, nlargest: int, min_weight: float, num_examples: int
+) -> Path:
+    return (
+        Path(output_dir)
+        / "domain_graphs"
+        / f"nlargest={nlargest},min_weight={float(min_weight)},num_examples={num_examples}.json"
+    )
+
+
+def domain_relation_edges(
+    matrix_df: "pd.DataFrame", nlargest: int, min_weight: float
+) -> list[dict]:
+    """
+    The nlargest relations of every domain with a weight of at least
+    min_weight, as graph edges.
+    """
+    edges = []
+    for domain_id in matrix_df.index:
+        sorted_relations = matrix_df.loc[domain_id].nlargest(nlargest)
+        for related_domain_id, score in sorted_relations.items():
+            if str(related_domain_id) == str(domain_id) or score < min_weight:
+                continue
+            edges.append(
+                {
+                    "source": str(domain_id),
+                    "target": str(related_domain_id),
+                    "weight": float(score),
+                }
+            )
+
+    return edges
+
+
+def make_domain_graph(
+    matrix_df: "pd.DataFrame",
+    packages_db: "pd.DataFrame",
+    datasets_db: "pd.DataFrame",
+    domains_db: "pd.DataFrame",
+    columns_db: "pd.DataFrame",
+    examples_db: "pd.DataFrame",
+    nlargest: int = 10,
+    min_weight: float = 0.5,
+    num_examples: int = 10,
+) -> dict:
+    """
+    Build the /domain-relations response from the tables produced by
+    make_metadata_for_db, without going through the database.
+    """
+    packages = {
+        row.id: {"id": int(row.id), "name": row.name}
+        for row in packages_db.itertuples(index=False)
+    }
+    datasets = {
+        row.id: {"id": int(row.id), "name": row.name, "package": packages[row.package_id]}
+        for row in datasets_db.itertuples(index=False)
+    }
+
+    examples = {}
+    for row in examples_db.sort_values("id").itertuples(index=False):
+        column_examples = examples.setdefault(row.column_id, [])
+        if len(column_examples) < num_examples:
+            column_examples.append({"value": row.value})
+
+    columns = {}
+    for row in columns_db.sort_values("id").itertuples(index=False):
+        if row.domain_id is None or row.domain_id != row.domain_id:  # None or NaN
+            continue
+        columns.setdefault(int(row.domain_id), []).append(
+            {
+                "id": int(row.id),
+                "name": row.name,
+                "dataset": datasets[row.dataset_id],
+                "examples": examples.get(row.id, []),
+            }
+        )
+
+    domain_ids = set(matrix_df.index)
+    domains = sorted(
+        (row for row in domains_db.itertuples(index=False) if row.id in domain_ids),
+        key=lambda row: domain_sort_key(row.name),
+    )
+    nodes = [
+        {
+            "id": int(row.id),
+            "name": row.name,
+            "columns": columns.get(int(row.id), []),
+        }
+        for row in domains
+    ]
+
+    return {
+        "nodes": nodes,
+        "edges": domain_relation_edges(matrix_df, nlargest, min_weight),
+    }
+
+
+def save_domain_graphs(
+    output_dir: Path,
+    matrix_df: "pd.DataFrame",
+    metadata_db: tuple,
+    parameters: list[dict] = GRAPH_PARAMETERS,
+) -> list[Path]:
+    """
+    Precompute and serialize the /domain-relations response for each set of
+    parameters.
+    """
+    paths = []
+    for params in parameters:
+        path = domain_graph_path(output_dir, **params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        payload = dumps(make_domain_graph(matrix_df, *metadata_db, **params))
+        paths.append(atomic_write(path, lambda f: f.write(payload)))
+
+    return paths
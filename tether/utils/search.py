@@ -0,0 +1,87 @@
+from collections import Counter
+import re
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Trigrams of a string as pg_trgm extracts them: lowercased words padded
+    with two spaces in front and one behind.
+    """
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-process inverted index from trigrams to documents, used to search the
+    catalog when the database has no trigram indexes (e.g. SQLite).
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, text: str) -> None:
+        doc = len(self.keys)
+        self.keys.append(key)
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, []).append(doc)
+
+    def search(self, query: str, threshold: float = 0.6) -> dict:
+        """
+        Score documents by the fraction of the query's trigrams they contain,
+        similar to pg_trgm's word_similarity. Returns the best score of each
+        key scoring at least threshold.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+
+        scores = {}
+        for doc, count in shared.items():
+            score = count / len(query_grams)
+            if score < threshold:
+                continue
+            key = self.keys[doc]
+            if score > scores.get(key, 0.0):
+                scores[key] = score
+        return scores
+
+
+class ColumnSearchIndex:
+    """
+    Search over column names and example values, ranking each column by its
+    best match.
+    """
+
+    def __init__(self):
+        self.names = TrigramIndex()
+        self.examples = TrigramIndex()
+
+    def add_column(self, column_id: int, name: str) -> None:
+        self.names.add(column_id, name)
+
+    def add_example(self, column_id: int, value: str) -> None:
+        self.examples.add(column_id, value)
+
+    def search(
+        self, query: str, limit: int = 20, threshold: float = 0.6
+    ) -> list[tuple[int, float]]:
+        scores = self.examples.search(query, threshold=threshold)
+        for column_id, score in self.names.search(query, threshold=threshold).items():
+            scores[column_id] = max(score, scores.get(column_id, 0.0))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
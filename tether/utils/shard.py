@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from pathlib import Path
+import zlib
+import numpy as np
+from tether.dataset.catalog import pack_strings, unpack_strings
+from tether.model.cluster import ColumnGaussian
+from tether.utils.files import atomic_write
+
+
+def shard_of(dataset_id: str, num_shards: int) -> int:
+    """
+    Stable shard assignment of a dataset, independent of the process and of
+    the order datasets are listed in.
+    """
+    return zlib.crc32(dataset_id.encode("utf-8")) % num_shards
+
+
+def shard_path(shard_dir: Path, shard: int, num_shards: int) -> Path:
+    return Path(shard_dir) / f"shard-{shard:04d}-of-{num_shards:04d}.npz"
+
+
+@dataclass
+class ColumnShard:
+    """
+    Encoded columns of the datasets assigned to one shard: for each column,
+    its dataset id and name, its ColumnGaussian and its example values.
+    """
+
+    shard: int
+    num_shards: int
+    packed: bool
+    dataset_ids: list[str]
+    column_names: list[str]
+    gaussians: list[ColumnGaussian]
+    examples: list[list[str]]
+
+    def save(self, shard_dir: Path) -> Path:
+        path = shard_path(shard_dir, self.shard, self.num_shards)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tables = {}
+        for name in ("dataset_ids", "column_names"):
+            data, offsets = pack_strings(getattr(self, name))
+            tables[f"{name}_data"] = data
+            tables[f"{name}_offsets"] = offsets
+
+        example_data, example_offsets = pack_strings(
+            [example for examples in self.examples for example in examples]
+        )
+        example_counts = np.array([len(e) for e in self.examples], dtype=np.int64)
+
+        # A crashed worker never leaves a partial shard behind for the merge.
+        return atomic_write(
+            path,
+            lambda f: np.savez(
+                f,
+                shard=np.array(self.shard),
+                num_shards=np.array(self.num_shards),
+                packed=np.array(self.packed),
+                means=np.array([g.mean for g in self.gaussians], dtype=np.float32),
+                covariances=np.array(
+                    [g.covariance for g in self.gaussians], dtype=np.float32
+                ),
+                example_data=example_data,
+                example_offsets=example_offsets,
+                example_counts=example_counts,
+                **tables,
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "ColumnShard":
+        with np.load(path) as data:
+            examples = unpack_strings(data["example_data"], data["example_offsets"])
+            bounds = np.concatenate([[0], np.cumsum(data["example_counts"])]).tolist()
+            return cls(
+                shard=int(data["shard"]),
+                num_shards=int(data["num_shards"]),
+                packed=bool(data["packed"]),
+                dataset_ids=unpack_strings(
+                    data["dataset_ids_data"], data["dataset_ids_offsets"]
+                ),
+                column_names=unpack_strings(
+                    data["column_names_data"], data["column_names_offsets"]
+                ),
+                gaussians=[
+                    ColumnGaussian(mean=mean, covariance=covariance)
+                    for mean, covariance in zip(data["means"], data["covariances"])
+                ],
+                examples=[
+                    examples[start:end] for start, end in zip(bounds, bounds[1:])
+                ],
+            )
+
+
+def load_shards(shard_dir: Path, num_shards: int) -> list[ColumnShard]:
+    """
+    Load every shard of a run, failing if any of them is missing.
+    """
+    shards = []
+    for shard in range(num_shards):
+        path = shard_path(shard_dir, shard, num_shards)
+        if not path.exists():
+            raise FileNotFoundError(f"Shard {shard}/{num_shards} not found at {path}.")
+        shards.append(ColumnShard.load(path))
+
+    if len({shard.packed for shard in shards}) > 1:
+        raise ValueError("Shards were encoded with different encoding settings.")
+
+    return shards